@@ -13,23 +13,30 @@ import glob
 import math
 import time
 import logging
+import asyncio
 import threading
+import queue
 import sqlite3
-from datetime import datetime
+import mmap
+import struct
+from array import array
+from datetime import datetime, timedelta
 from collections import OrderedDict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from fastapi import FastAPI, Request, Body, Query, Form, HTTPException, BackgroundTasks
+import numpy as np
 import pandas as pd
 import requests
 import pyotp
 
 # === External modules expected to be present (same as your Flask app) ===
-from MOFSLOPENAPI import MOFSLOPENAPI
+from MOFSLOPENAPI import MOFSLOPENAPI, AsyncMOFSLOPENAPI, CloseAsyncHttpClient
 from init_dirs import ensure_data_dirs
 
 # === FastAPI / Starlette imports ===
 from fastapi import FastAPI, Request, Body, Query, Form, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from starlette.staticfiles import StaticFiles
@@ -63,7 +70,6 @@ COPYTRADING_FOLDER = DIRS["COPYTRADING_FOLDER"]
 position_meta = {}
 summary_data_global = {}
 client_capital_map = {}
-symbol_db_lock = threading.Lock()
 
 GITHUB_CSV_URL = "https://raw.githubusercontent.com/Pramod541988/Stock_List/main/security_id.csv"
 SQLITE_DB = "symbols.db"
@@ -78,33 +84,986 @@ SourceID = "Desktop"
 browsername = "chrome"
 browserversion = "104"
 
-# Active MOFSL sessions: name → (Mofsl, userid)
-mofsl_sessions = {}
+class SessionRegistry:
+    """Logged-in MOFSL sessions indexed by client name and by userid.
+
+    Each entry is (Mofsl, userid, AsyncMofsl); the asyncio twin shares the sync session's token/headers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_name = {}      # name → (Mofsl, userid, AsyncMofsl)
+        self.by_userid = {}    # userid → name
+
+    def put(self, name, Mofsl, userid, AsyncMofsl):
+        """Add or replace (re-login) a client's session in one step."""
+        with self.lock:
+            previous = self.by_name.get(name)
+            if previous and self.by_userid.get(previous[1]) == name:
+                del self.by_userid[previous[1]]
+            self.by_name[name] = (Mofsl, userid, AsyncMofsl)
+            self.by_userid[userid] = name
+
+    def remove(self, name):
+        """Drop a client's session (client deleted)."""
+        with self.lock:
+            previous = self.by_name.pop(name, None)
+            if previous and self.by_userid.get(previous[1]) == name:
+                del self.by_userid[previous[1]]
+
+    def get(self, name):
+        """(Mofsl, userid) for a client name, or None."""
+        with self.lock:
+            entry = self.by_name.get(name)
+        return (entry[0], entry[1]) if entry else None
+
+    def get_async(self, name):
+        with self.lock:
+            entry = self.by_name.get(name)
+        return entry[2] if entry else None
+
+    def get_by_userid(self, userid):
+        """(name, Mofsl, userid) for a userid, or (None, None, None)."""
+        with self.lock:
+            name = self.by_userid.get(userid)
+            entry = self.by_name.get(name) if name is not None else None
+        if not entry:
+            return None, None, None
+        return name, entry[0], entry[1]
+
+    def items(self):
+        """Snapshot of (name, (Mofsl, userid)) pairs, safe to iterate while clients log in."""
+        with self.lock:
+            return [(name, (entry[0], entry[1])) for name, entry in self.by_name.items()]
+
+# Active MOFSL sessions
+mofsl_sessions = SessionRegistry()
+
+# =========================
+# Live market data
+# =========================
+MARKET_FEED = os.getenv("MARKET_FEED", "1") == "1"                          # stream prices over the broadcast websocket
+MARKET_FEED_CLIENT = os.getenv("MARKET_FEED_CLIENT", "")                    # client whose session carries the feed; first logged-in if empty
+MARKET_FEED_MAX_SILENCE = float(os.getenv("MARKET_FEED_MAX_SILENCE", "60"))  # seconds without ticks before readers fall back to REST
+
+class MarketQuote:
+    """Latest feed values for one (exchange, scrip); every field is replaced as a whole tuple."""
+
+    __slots__ = ("ltp", "depth", "ohlc", "oi", "updated")
+
+    def __init__(self):
+        self.ltp = None             # (rate, qty, cumulative qty, avg trade price, time)
+        self.depth = (None,) * 5    # per level: (bid rate, bid qty, bid orders, offer rate, offer qty, offer orders)
+        self.ohlc = None            # (open, high, low, prev day close)
+        self.oi = None              # (open interest, high, low)
+        self.updated = 0.0
+
+class MarketDataCache:
+    """Last LTP, 5-level depth, OHLC and OI per (exchange, scrip), fed by MOFSLOPENAPI broadcast callbacks.
+
+    Only the feed thread writes. Readers take no lock: a quote's fields are immutable tuples
+    swapped in one assignment, so a reader sees either the old or the new value, never a mix.
+    """
+
+    def __init__(self, max_silence):
+        self.quotes = {}            # (exchange, scrip) → MarketQuote
+        self.max_silence = max_silence
+        self.last_tick = 0.0
+        self.ticks = 0
+
+    def on_message(self, message_type, data):
+        if not isinstance(data, dict):
+            return
+        key = (data.get("Exchange"), data.get("Scrip Code"))
+        quote = self.quotes.get(key)
+        if quote is None:
+            quote = MarketQuote()
+            self.quotes[key] = quote
+        if message_type == "LTP":
+            quote.ltp = (data["LTP_Rate"], data["LTP_Qty"], data["LTP_Cumulative Qty"], data["LTP_AvgTradePrice"], data["Time"])
+        elif message_type == "Index":
+            quote.ltp = (data["Rate"], 0, 0, 0.0, data["Time"])
+        elif message_type == "MarketDepth":
+            depth = list(quote.depth)
+            depth[data["Level"] - 1] = (data["BidRate"], data["BidQty"], data["BidOrder"],
+                                        data["OfferRate"], data["OfferQty"], data["OfferOrder"])
+            quote.depth = tuple(depth)
+        elif message_type == "DayOHLC":
+            quote.ohlc = (data["Open"], data["High"], data["Low"], data["PrevDayClose"])
+        elif message_type == "OpenInterest":
+            quote.oi = (data["Open Interest"], data["Open Interest High"], data["Open Interest Low"])
+        else:
+            return
+        quote.updated = self.last_tick = time.time()
+        self.ticks += 1
+
+    def live(self):
+        """True while the feed has ticked recently; a silent or dropped feed must not serve frozen prices."""
+        return time.time() - self.last_tick <= self.max_silence
+
+    def quote(self, exchange, scrip):
+        """MarketQuote for (exchange, scrip), or None when unknown or the feed is not live."""
+        if not self.live():
+            return None
+        try:
+            return self.quotes.get(((exchange or "").upper(), int(scrip)))
+        except (TypeError, ValueError):
+            return None
+
+    def ltp(self, exchange, scrip):
+        """Live last traded price, or None (callers then ask the REST API)."""
+        quote = self.quote(exchange, scrip)
+        ltp = quote.ltp if quote is not None else None
+        return ltp[0] if ltp else None
+
+    def metrics(self):
+        return {
+            "live": self.live(),
+            "quotes": len(self.quotes),
+            "ticks": self.ticks,
+            "seconds_since_tick": round(time.time() - self.last_tick, 1) if self.last_tick else None,
+        }
+
+market_data_cache = MarketDataCache(MARKET_FEED_MAX_SILENCE)
+
+class MarketFeed:
+    """Broadcast websocket on one logged-in session, feeding market_data_cache.
+
+    Scrips are subscribed on first demand (watch) up to the broker's broadcast limit and
+    registered again whenever the websocket (re)opens.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.session = None
+        self.client = None
+        self.open = False
+        self.watched = set()        # (exchange, scrip)
+
+    def start(self, name=""):
+        session = mofsl_sessions.get(name) if name else None
+        if session is None and not name:
+            sessions = mofsl_sessions.items()
+            if sessions:
+                name, session = sessions[0]
+        if session is None:
+            print(f"⚠️ Market feed not started: no session for {name or 'any client'}")
+            return False
+
+        Mofsl = session[0]
+        # MOFSLOPENAPI calls these hooks on the instance
+        Mofsl._Broadcast_on_open = self._on_open
+        Mofsl._Broadcast_on_message = lambda ws1, message_type, data: self.cache.on_message(message_type, data)
+        Mofsl._Broadcast_on_close = self._on_close
+        self.session, self.client = Mofsl, name
+        Mofsl.Broadcast_connect()
+        print(f"📡 Market feed starting on {name}")
+        return True
+
+    def _on_open(self, ws1):
+        self.open = True
+        with self.lock:
+            watched = list(self.watched)
+        if not watched:
+            self.session.Login_on_open()
+        for exchange, scrip in watched:
+            self._register(exchange, scrip)
+
+    def _on_close(self, ws1, close_status_code, close_msg):
+        self.open = False
+        print(f"📡 Market feed closed: {close_status_code} {close_msg}")
+
+    def watch(self, exchange, scrip):
+        """Subscribe (exchange, scrip) if not yet streamed; cheap to call on every cache miss."""
+        try:
+            key = ((exchange or "").upper(), int(scrip))
+        except (TypeError, ValueError):
+            return
+        if self.session is None or key in self.watched:
+            return
+        limit = self.session.m_MaxBroadcastLimit or 200
+        with self.lock:
+            if key in self.watched or len(self.watched) >= limit:
+                return
+            self.watched.add(key)
+        if self.open:
+            self._register(*key)
+
+    def _register(self, exchange, scrip):
+        exchangetype = "CASH" if exchange in ("NSE", "BSE") else "DERIVATIVES"
+        try:
+            self.session.Register(exchange, exchangetype, scrip)
+        except Exception as e:
+            print(f"❌ Market feed subscribe failed for {exchange} {scrip}: {e}")
+
+    def metrics(self):
+        return {"client": self.client, "open": self.open, "watched": len(self.watched)}
+
+market_feed = MarketFeed(market_data_cache)
+
+def live_ltp(exchange, scrip):
+    """Streamed LTP for (exchange, scrip), or None; a miss subscribes it so later reads hit."""
+    ltp = market_data_cache.ltp(exchange, scrip)
+    if ltp is None:
+        market_feed.watch(exchange, scrip)
+    return ltp
+
+LTP_CACHE_TTL = float(os.getenv("LTP_CACHE_TTL", "5"))                    # seconds a REST LTP is shared
+LTP_FETCH_WORKERS = int(os.getenv("LTP_FETCH_WORKERS", "8"))              # concurrent GetLtp calls
+LTP_RATE_LIMIT = float(os.getenv("LTP_RATE_LIMIT", "20"))                 # GetLtp calls per second, all sessions together
+HOLDINGS_FETCH_WORKERS = int(os.getenv("HOLDINGS_FETCH_WORKERS", "16"))   # concurrent per-client holdings/margin calls
+
+class LtpResolver:
+    """LTPs for many (exchange, scrip) pairs with at most one REST call per distinct scrip.
+
+    Streamed prices win. Otherwise a GetLtp result is shared for `ttl` seconds, concurrent
+    requests for one scrip wait on the same in-flight call, and calls are paced to `rate`
+    per second and spread over the given sessions.
+    """
+
+    def __init__(self, ttl, workers, rate):
+        self.ttl = ttl
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.cache = {}             # (exchange, scrip) → (ltp, fetched at)
+        self.inflight = {}          # (exchange, scrip) → Future
+        self.next_call = 0.0
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ltp")
+        self.streamed = 0
+        self.hits = 0
+        self.fetches = 0
+
+    def _pace(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def _fetch(self, key, session):
+        Mofsl, userid = session
+        exchange, scrip = key
+        try:
+            self._pace()
+            response = Mofsl.GetLtp({"clientcode": userid, "exchange": exchange, "scripcode": scrip}) or {}
+            ltp = float((response.get("data") or {}).get("ltp", 0)) / 100
+            with self.lock:
+                self.fetches += 1
+                if response.get("status") == "SUCCESS":
+                    self.cache[key] = (ltp, time.monotonic())
+            return ltp
+        except Exception as e:
+            print(f"❌ LTP fetch failed for {exchange} {scrip}: {e}")
+            return None
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def resolve(self, keys, sessions):
+        """{(exchange, scrip): ltp} for the distinct keys; a failed fetch resolves to 0.0."""
+        prices, pending = {}, {}
+        for i, key in enumerate(dict.fromkeys(keys)):
+            ltp = live_ltp(*key)
+            if ltp is not None:
+                prices[key] = ltp
+                self.streamed += 1
+                continue
+            with self.lock:
+                cached = self.cache.get(key)
+                if cached and time.monotonic() - cached[1] <= self.ttl:
+                    prices[key] = cached[0]
+                    self.hits += 1
+                    continue
+                future = self.inflight.get(key)
+                if future is None:
+                    future = self.executor.submit(self._fetch, key, sessions[i % len(sessions)])
+                    self.inflight[key] = future
+            pending[key] = future
+        for key, future in pending.items():
+            ltp = future.result()
+            prices[key] = ltp if ltp is not None else 0.0
+        return prices
+
+    def metrics(self):
+        with self.lock:
+            return {"streamed": self.streamed, "cache_hits": self.hits, "fetches": self.fetches,
+                    "cached": len(self.cache), "inflight": len(self.inflight)}
+
+ltp_resolver = LtpResolver(LTP_CACHE_TTL, LTP_FETCH_WORKERS, LTP_RATE_LIMIT)
+holdings_fetch_executor = ThreadPoolExecutor(max_workers=HOLDINGS_FETCH_WORKERS, thread_name_prefix="holdings")
 
 # =========================
 # Symbol DB
 # =========================
-def recreate_sqlite_from_csv():
-    """Recreate symbols.db from GitHub CSV."""
-    r = requests.get(GITHUB_CSV_URL, timeout=30)
-    r.raise_for_status()
-    with open("security_id.csv", "wb") as f:
-        f.write(r.content)
+def security_id_key(value):
+    """Normalise a Security ID / symboltoken (int, float or str) to the index key."""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+SYMBOL_COLUMNS = "symbols.cols"          # columnar snapshot of the symbol master, memory-mapped at startup
+SYMBOL_COLUMNS_MAGIC = b"SYMCOLS1"
+
+def align8(n):
+    return (n + 7) & ~7
+
+def new_symbol_stamp():
+    """Generation stamp shared by a symbols.db (PRAGMA user_version) and its symbols.cols header."""
+    return int.from_bytes(os.urandom(4), "little") & 0x7FFFFFFF or 1
+
+def write_symbol_columns(df, path, stamp=0):
+    """Write the columns the app uses as one file: magic, JSON header, then 8-byte aligned arrays.
+
+    Arrays: exchange code (uint8, 255 = missing), Security ID (int64, -1 = missing), Min Qty,
+    symbol byte offsets into a newline-separated UTF-8 blob, and Security IDs sorted for lookups.
+    """
+    exchanges_raw = df["Exchange"].tolist()
+    exchange_names = sorted({e for e in exchanges_raw if isinstance(e, str)})
+    code_of = {e: i for i, e in enumerate(exchange_names)}
+    exchange = np.array([code_of.get(e, 255) for e in exchanges_raw], dtype=np.uint8)
+
+    security_id = pd.to_numeric(df["Security ID"], errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+    min_qty = pd.to_numeric(df["Min Qty"], errors="coerce").fillna(1).astype(np.int64)
+    min_qty = min_qty.where(min_qty != 0, 1).to_numpy()
+
+    encoded = [(s if isinstance(s, str) else "").encode("utf-8") for s in df["Stock Symbol"].tolist()]
+    symbol_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    symbol_offsets[1:] = np.cumsum([len(b) + 1 for b in encoded])
+    symbol_blob = np.frombuffer(b"\n".join(encoded) + b"\n", dtype=np.uint8) if encoded else np.zeros(0, np.uint8)
+
+    # Stable sort: the first row for a Security ID wins, same as the old per-order SELECT
+    order = np.argsort(security_id, kind="stable")
+    order = order[security_id[order] >= 0]
+    sid_sorted = security_id[order]
+
+    sections, arrays, offset = {}, [], 0
+    for name, arr in (
+        ("exchange", exchange), ("security_id", security_id), ("min_qty", min_qty),
+        ("symbol_offsets", symbol_offsets), ("symbol_blob", symbol_blob),
+        ("sid_sorted", sid_sorted), ("sid_rows", order.astype(np.int64)),
+    ):
+        arr = np.ascontiguousarray(arr)
+        sections[name] = [arr.dtype.str, int(arr.size), offset]
+        arrays.append(arr)
+        offset = align8(offset + arr.nbytes)
+    header = json.dumps(
+        {"rows": len(encoded), "exchanges": exchange_names, "stamp": stamp, "sections": sections}
+    ).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(SYMBOL_COLUMNS_MAGIC + struct.pack("<I", len(header)) + header)
+        data_start = align8(f.tell())
+        f.write(b"\0" * (data_start - f.tell()))
+        for arr, (_, _, arr_offset) in zip(arrays, sections.values()):
+            f.write(b"\0" * (data_start + arr_offset - f.tell()))
+            f.write(arr.tobytes())
+
+def symbol_columns_stamp(path):
+    """The stamp in a columns file's header, without mapping it; None if missing or written before stamps."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if head[:8] != SYMBOL_COLUMNS_MAGIC:
+            return None
+        (header_len,) = struct.unpack_from("<I", head, 8)
+        return json.loads(f.read(header_len)).get("stamp")
+
+class SymbolColumns:
+    """Read-only, memory-mapped view of a write_symbol_columns file.
+
+    Pages come from the OS page cache, so every worker process shares one copy. Also acts as the
+    Security ID → Min Qty mapping (`get`) used by the copy and square-off paths.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:8] != SYMBOL_COLUMNS_MAGIC:
+            raise ValueError(f"{path} is not a symbol columns file")
+        (header_len,) = struct.unpack_from("<I", self.mm, 8)
+        header = json.loads(self.mm[12:12 + header_len])
+        data_start = align8(12 + header_len)
+
+        self.rows = header["rows"]
+        self.exchange_names = header["exchanges"]
+        for name, (dtype, count, offset) in header["sections"].items():
+            if count:
+                arr = np.frombuffer(self.mm, dtype=dtype, count=count, offset=data_start + offset)
+            else:
+                arr = np.zeros(0, dtype=dtype)
+            setattr(self, name, arr)
+
+    def get(self, key, default=1):
+        """Min Qty for a Security ID key (see security_id_key); default when unknown."""
+        try:
+            sid = int(key)
+        except (TypeError, ValueError):
+            return default
+        i = int(np.searchsorted(self.sid_sorted, sid))
+        if i < self.sid_sorted.size and self.sid_sorted[i] == sid:
+            return int(self.min_qty[self.sid_rows[i]])
+        return default
+
+    def symbols(self):
+        return bytes(self.symbol_blob).decode("utf-8").split("\n")[:-1]
+
+    def search_rows(self):
+        """(exchanges, symbols, security_ids) lists for SymbolSearchIndex; missing values come back as None."""
+        names = self.exchange_names
+        exchanges = [names[c] if c != 255 else None for c in self.exchange.tolist()]
+        symbols = [s if s else None for s in self.symbols()]
+        security_ids = [sid if sid >= 0 else None for sid in self.security_id.tolist()]
+        return exchanges, symbols, security_ids
+
+def get_min_qty(symboltoken):
+    """Lot size for a Security ID; 1 when unknown."""
+    return symbol_snapshot.columns.get(security_id_key(symboltoken), 1)
+
+class SymbolSearchIndex:
+    """In-memory /search_symbols index: rows sorted by symbol plus trigram postings over the lowercase symbol.
+
+    Matches the SQL it replaces: every word must be a substring of the symbol, optional exact
+    (upper-cased) exchange, ordered by symbol, first `limit` rows.
+    """
+
+    def __init__(self, exchanges, symbols, security_ids):
+        rows = [
+            (exch, sym, sid)
+            for exch, sym, sid in zip(exchanges, symbols, security_ids)
+            if isinstance(sym, str)
+        ]
+        rows.sort(key=lambda r: r[1])
+        self.rows = rows
+        self.keys = [r[1].lower() for r in rows]
+        self.exchanges = [r[0].upper() if isinstance(r[0], str) else None for r in rows]
+
+        # Postings hold row numbers in ascending (= symbol) order
+        self.grams = {}
+        self.by_exchange = {}
+        for i, key in enumerate(self.keys):
+            for gram in {key[j:j + 3] for j in range(len(key) - 2)}:
+                posting = self.grams.get(gram)
+                if posting is None:
+                    posting = self.grams[gram] = array('I')
+                posting.append(i)
+            exch = self.exchanges[i]
+            if exch is not None:
+                self.by_exchange.setdefault(exch, array('I')).append(i)
+
+    def candidates(self, words, exchange=""):
+        """Row numbers worth checking, in symbol order: the shortest posting list for the query."""
+        # Words under 3 chars have no postings; they are only checked in matches()
+        candidates = None
+        for w in words:
+            for j in range(len(w) - 2):
+                posting = self.grams.get(w[j:j + 3])
+                if posting is None:
+                    return ()
+                if candidates is None or len(posting) < len(candidates):
+                    candidates = posting
+        if exchange:
+            posting = self.by_exchange.get(exchange)
+            if posting is None:
+                return ()
+            if candidates is None or len(posting) < len(candidates):
+                candidates = posting
+        return range(len(self.rows)) if candidates is None else candidates
+
+    def matches(self, candidates, words, exchange="", limit=None):
+        """Row numbers from candidates whose symbol contains every word (and on the exchange), at most limit."""
+        keys, exchanges, found = self.keys, self.exchanges, []
+        for i in candidates:
+            key = keys[i]
+            if all(w in key for w in words) and (not exchange or exchanges[i] == exchange):
+                found.append(i)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def search(self, words, exchange="", limit=20):
+        """Rows (Exchange, Stock Symbol, Security ID) whose symbol contains every lowercase word."""
+        rows = self.rows
+        return [rows[i] for i in self.matches(self.candidates(words, exchange), words, exchange, limit)]
+
+SYMBOL_SEARCH_CACHE_SIZE = int(os.getenv("SYMBOL_SEARCH_CACHE_SIZE", "2048"))              # cached queries
+SYMBOL_SEARCH_CACHE_CANDIDATES = int(os.getenv("SYMBOL_SEARCH_CACHE_CANDIDATES", "1000"))  # max candidate rows for a prefix match set
+
+class SymbolSearchCache:
+    """Bounded LRU of (exchange, query) → result rows for type-ahead search.
+
+    When the in-memory index answers and the query's candidate list is at most `max_candidates`
+    long, every matching row number is kept too, so a longer query ("reli" after "rel") is
+    answered by filtering its longest cached prefix's matches instead of searching again.
+    Entries belong to one symbol generation; a refresh empties the cache.
+    """
+
+    def __init__(self, max_entries, max_candidates):
+        self.max_entries = max_entries
+        self.max_candidates = max_candidates
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # (exchange, query) → (rows, all matching row numbers or None)
+        self.generation = None
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+
+    def search(self, snap, words, exchange, run_search, limit=20):
+        """Cached rows for the query; run_search(limit) computes them when snap has no in-memory index."""
+        query = " ".join(words)
+        key = (exchange, query)
+        index = snap.search_index
+        base = None
+        with self.lock:
+            if self.generation != snap.generation:
+                self.entries.clear()
+                self.generation = snap.generation
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if index is not None:
+                for n in range(len(query) - 1, 0, -1):
+                    prefix_entry = self.entries.get((exchange, query[:n]))
+                    if prefix_entry is not None and prefix_entry[1] is not None:
+                        self.entries.move_to_end((exchange, query[:n]))
+                        base = prefix_entry[1]
+                        break
+
+        ids = None
+        if index is None:
+            rows = run_search(limit)
+        else:
+            if base is not None:
+                # Every match of the longer query is a match of its prefix, already in symbol order
+                ids = index.matches(base, words)
+            else:
+                candidates = index.candidates(words, exchange)
+                if len(candidates) <= self.max_candidates:
+                    ids = index.matches(candidates, words, exchange)
+                else:
+                    ids = None
+                    rows = [index.rows[i] for i in index.matches(candidates, words, exchange, limit)]
+            if ids is not None:
+                rows = [index.rows[i] for i in ids[:limit]]
+
+        with self.lock:
+            if base is not None:
+                self.prefix_hits += 1
+            else:
+                self.misses += 1
+            if self.generation == snap.generation:
+                self.entries[key] = (rows, ids)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return rows
+
+    def metrics(self):
+        with self.lock:
+            lookups = self.hits + self.prefix_hits + self.misses
+            return {
+                "generation": self.generation,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "prefix_hits": self.prefix_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.prefix_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+symbol_search_cache = SymbolSearchCache(SYMBOL_SEARCH_CACHE_SIZE, SYMBOL_SEARCH_CACHE_CANDIDATES)
+
+# "memory": SymbolSearchIndex above; "fts": FTS5 table inside symbols.db (lower RSS on small containers)
+SYMBOL_SEARCH_BACKEND = os.getenv("SYMBOL_SEARCH_BACKEND", "memory").strip().lower()
+FTS_TABLE = f"{TABLE_NAME}_fts"
+
+class SymbolSnapshot:
+    """One generation of the symbol master: the DB file and the lookups built from the same CSV."""
+
+    def __init__(self, generation, db_path, columns, search_index, fts_ready):
+        self.generation = generation
+        self.db_path = db_path
+        self.columns = columns              # SymbolColumns (Security ID → Min Qty via .get)
+        self.search_index = search_index    # SymbolSearchIndex; None on the fts backend or while it builds
+        self.fts_ready = fts_ready
+        self.symbol_list = None             # (DISTINCT symbols, {"symbols": ...} JSON) for the dashboard
+        self.symbol_list_lock = threading.Lock()
+
+    def distinct_symbols(self):
+        """DISTINCT [Stock Symbol] in table order plus its pre-serialised JSON, computed once per generation."""
+        if self.symbol_list is None:
+            with self.symbol_list_lock:
+                if self.symbol_list is None:
+                    symbols = []
+                    if isinstance(self.columns, SymbolColumns):
+                        symbols = list(dict.fromkeys(s or None for s in self.columns.symbols()))
+                    self.symbol_list = (symbols, json.dumps({"symbols": symbols}))
+        return self.symbol_list
+
+# Readers take `snap = symbol_snapshot` once and use only that object; a refresh publishes a
+# complete new generation by rebinding, so nobody sees a half-swapped mix or blocks on the build.
+symbol_snapshot = SymbolSnapshot(0, SQLITE_DB, {}, None, False)
+
+def build_symbol_indexes(conn):
+    """Add Security ID / Exchange indexes and the FTS5 search table; returns False if FTS5 is unavailable."""
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_security_id ON {TABLE_NAME}([Security ID])")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_exchange ON {TABLE_NAME}(UPPER(Exchange))")
+    conn.commit()
+    try:
+        # trigram tokens keep substring semantics ("nifty" finds BANKNIFTY), which word tokens would lose
+        conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        conn.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(symbol, tokenize='trigram')")
+        conn.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, symbol) "
+            f"SELECT rowid, [Stock Symbol] FROM {TABLE_NAME} WHERE [Stock Symbol] IS NOT NULL"
+        )
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as e:
+        print(f"❌ FTS5 unavailable, symbol search stays on LIKE: {e}")
+        return False
+
+def fts_search_sql(words, exchange_filter, limit=20):
+    """SQL + params for an FTS5 symbol search ranked exact match, then prefix, then the rest by symbol."""
+    # Trigram MATCH needs 3+ chars; shorter words are checked with LIKE on the matched rows
+    long_words = [w for w in words if len(w) >= 3]
+    where_clauses = []
+    params = []
+    if long_words:
+        source = f"{FTS_TABLE} JOIN {TABLE_NAME} s ON s.rowid = {FTS_TABLE}.rowid"
+        where_clauses.append(f"{FTS_TABLE} MATCH ?")
+        params.append(" AND ".join('"' + w.replace('"', '""') + '"' for w in long_words))
+    else:
+        source = f"{TABLE_NAME} s"
+    for w in words:
+        if len(w) < 3:
+            where_clauses.append("LOWER(s.[Stock Symbol]) LIKE ?")
+            params.append(f"%{w}%")
+    if exchange_filter:
+        where_clauses.append("UPPER(s.Exchange) = ?")
+        params.append(exchange_filter)
+
+    sql = f"""
+        SELECT s.Exchange, s.[Stock Symbol], s.[Security ID]
+        FROM {source}
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY CASE
+                     WHEN LOWER(s.[Stock Symbol]) = ? THEN 0
+                     WHEN LOWER(s.[Stock Symbol]) LIKE ? THEN 1
+                     ELSE 2
+                 END,
+                 s.[Stock Symbol]
+        LIMIT {int(limit)}
+    """
+    params += [" ".join(words), f"{words[0]}%"]
+    return sql, params
+
+SYMBOL_CSV = "security_id.csv"
+SYMBOL_META = "security_id.meta.json"    # ETag / Last-Modified of the CSV symbols.db was built from
+symbol_refresh_lock = threading.Lock()
 
-    if os.path.exists(SQLITE_DB):
-        os.remove(SQLITE_DB)
+def load_symbol_meta():
+    try:
+        with open(SYMBOL_META, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
 
-    df = pd.read_csv("security_id.csv")
-    conn = sqlite3.connect(SQLITE_DB)
+SYMBOL_DB_MMAP_SIZE = int(os.getenv("SYMBOL_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+symbol_db_local = threading.local()
+
+def get_symbol_db(snap=None):
+    """Read-only connection to a symbol DB generation, opened once per thread and reused.
+
+    A published symbols.db is never written again (refresh swaps in a new file), so readers open it
+    immutable: no locks, no -wal/-shm sidecars, and no lock to share between request threads.
+    Repeated SQL text hits the connection's prepared-statement cache.
+    """
+    snap = snap or symbol_snapshot
+    local = symbol_db_local
+    if getattr(local, "generation", None) != snap.generation:
+        old = getattr(local, "conn", None)
+        if old is not None:
+            old.close()
+        conn = sqlite3.connect(f"file:{snap.db_path}?mode=ro&immutable=1", uri=True, cached_statements=256)
+        conn.execute(f"PRAGMA mmap_size={SYMBOL_DB_MMAP_SIZE}")
+        local.conn, local.generation = conn, snap.generation
+    return local.conn
+
+def make_symbol_snapshot(columns, fts_ready, with_search_index=True):
+    """Next generation's lookups (built before anything is swapped)."""
+    return SymbolSnapshot(
+        symbol_snapshot.generation + 1,
+        SQLITE_DB,
+        columns,
+        SymbolSearchIndex(*columns.search_rows()) if with_search_index and SYMBOL_SEARCH_BACKEND == "memory" else None,
+        fts_ready,
+    )
+
+def publish_symbol_snapshot(snapshot):
+    global symbol_snapshot
+    symbol_snapshot = snapshot
+    print(f"Symbol master generation {snapshot.generation} live")
+    return snapshot
+
+def build_symbol_db(csv_path):
+    """Build the next generation from a CSV: new DB and columns in temp files, then swap files and lookups together."""
+    df = pd.read_csv(csv_path)
+    tmp_db = SQLITE_DB + ".tmp"
+    if os.path.exists(tmp_db):
+        os.remove(tmp_db)
+    stamp = new_symbol_stamp()
+    conn = sqlite3.connect(tmp_db)
     df.to_sql(TABLE_NAME, conn, index=False, if_exists="replace")
+    fts_ready = build_symbol_indexes(conn)
+    conn.execute(f"PRAGMA user_version = {stamp}")
     conn.close()
 
+    tmp_columns = SYMBOL_COLUMNS + ".tmp"
+    write_symbol_columns(df, tmp_columns, stamp)
+    snapshot = make_symbol_snapshot(SymbolColumns(tmp_columns), fts_ready)
+    snapshot.distinct_symbols()
+
+    # Readers keep the old generation (and the old files, via their open handles/maps) until here.
+    # A crash between the two replaces is caught by load_symbol_snapshot's stamp check.
+    os.replace(tmp_db, SQLITE_DB)
+    os.replace(tmp_columns, SYMBOL_COLUMNS)
+    return publish_symbol_snapshot(snapshot)
+
+def build_search_index_in_background(snapshot):
+    """Precompute the symbol list and attach the in-memory search index to a live snapshot (SQL serves search meanwhile)."""
+    def build():
+        try:
+            snapshot.distinct_symbols()
+            if SYMBOL_SEARCH_BACKEND != "memory":
+                return
+            index = SymbolSearchIndex(*snapshot.columns.search_rows())
+        except Exception as e:
+            print("❌ Failed to build symbol search index:", e)
+            return
+        with symbol_refresh_lock:
+            if symbol_snapshot is snapshot:
+                ready = SymbolSnapshot(snapshot.generation, snapshot.db_path, snapshot.columns, index, snapshot.fts_ready)
+                ready.symbol_list = snapshot.symbol_list
+                publish_symbol_snapshot(ready)
+
+    threading.Thread(target=build, daemon=True).start()
+
+def load_symbol_snapshot():
+    """Serve the last good symbols.db + symbols.cols without touching the network; False if none exists.
+
+    The columns file is only mapped, not parsed, so lot sizes are live at once; the search index
+    builds on a background thread. A columns file that is missing or whose stamp doesn't match the
+    DB's is rebuilt from the DB's own table, so the two always describe the same generation.
+    """
+    with symbol_refresh_lock:
+        if not os.path.exists(SQLITE_DB):
+            return False
+        conn = sqlite3.connect(SQLITE_DB)
+        try:
+            stamp = conn.execute("PRAGMA user_version").fetchone()[0]
+            fts_ready = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+            ).fetchone() is not None
+            columns_stamp = symbol_columns_stamp(SYMBOL_COLUMNS)
+            if columns_stamp != stamp:
+                # Columns from another generation (crash mid-swap), or from before the columnar format or stamps
+                print(f"[DEBUG] {SYMBOL_COLUMNS} stamp {columns_stamp} doesn't match {SQLITE_DB} stamp {stamp}, "
+                      f"rebuilding it from the DB")
+                df = pd.read_sql(
+                    f"SELECT Exchange, [Stock Symbol], [Security ID], [Min Qty] FROM {TABLE_NAME} ORDER BY rowid", conn
+                )
+                write_symbol_columns(df, SYMBOL_COLUMNS + ".tmp", stamp)
+                os.replace(SYMBOL_COLUMNS + ".tmp", SYMBOL_COLUMNS)
+        finally:
+            conn.close()
+        snapshot = publish_symbol_snapshot(
+            make_symbol_snapshot(SymbolColumns(SYMBOL_COLUMNS), fts_ready, with_search_index=False)
+        )
+    build_search_index_in_background(snapshot)
+    return True
+
+def recreate_sqlite_from_csv():
+    """Refresh symbols.db from the GitHub CSV; returns False when GitHub reports it unchanged (304)."""
+    with symbol_refresh_lock:
+        headers = {}
+        if os.path.exists(SQLITE_DB) and os.path.exists(SYMBOL_CSV):
+            meta = load_symbol_meta()
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        r = requests.get(GITHUB_CSV_URL, headers=headers, timeout=30)
+        if r.status_code == 304:
+            return False
+        r.raise_for_status()
+
+        tmp_csv = SYMBOL_CSV + ".tmp"
+        with open(tmp_csv, "wb") as f:
+            f.write(r.content)
+        build_symbol_db(tmp_csv)
+
+        # Only a successful build advances the cached CSV and its validators
+        os.replace(tmp_csv, SYMBOL_CSV)
+        with open(SYMBOL_META, "w") as f:
+            json.dump({"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}, f)
+        return True
+
 # Backward-compat alias for your old route call
 def update_symbol_db_from_github():
-    recreate_sqlite_from_csv()
+    return recreate_sqlite_from_csv()
+
+# --- Symbol master from the broker's instrument files ---
+SYMBOL_MASTER_SOURCE = os.getenv("SYMBOL_MASTER_SOURCE", "github").strip().lower()   # "github" or "broker"
+SYMBOL_EXCHANGES = [
+    e.strip().upper()
+    for e in os.getenv("SYMBOL_EXCHANGES", "NSE,BSE,NSEFO,BSEFO,MCX,NSECD,NCDEX").split(",")
+    if e.strip()
+]
+SYMBOL_EXCHANGE_DIR = "symbol_exchanges"    # last good instrument rows, one CSV per exchange
+SYMBOL_REFRESH_TIME = datetime.strptime(os.getenv("SYMBOL_REFRESH_TIME", "08:30"), "%H:%M").time()   # daily refresh
+
+# symbols table column → GetInstrumentFile keys (first non-empty wins)
+INSTRUMENT_COLUMNS = {
+    "Stock Symbol": ("scripname", "scripshortname", "symbol"),
+    "Security ID": ("scripcode", "securityid", "symboltoken"),
+    "Min Qty": ("marketlot", "lotsize", "minqty"),
+}
+
+class InstrumentLayoutError(ValueError):
+    """An instrument file doesn't carry the columns the symbols table is built from."""
+
+def parse_instrument_rows(exchange, data):
+    """Map GetInstrumentFile rows onto the symbols table columns.
+
+    Raises InstrumentLayoutError when a column has none of its keys, rather than writing a table of
+    misnamed columns. An empty file raises a plain ValueError: that exchange keeps its last good file.
+    """
+    items = [item for item in data if isinstance(item, dict)]
+    if not items:
+        raise ValueError(f"{exchange}: instrument file has no rows")
+    keys = set().union(*(item.keys() for item in items[:100]))
+    missing = [column for column, aliases in INSTRUMENT_COLUMNS.items() if not keys.intersection(aliases)]
+    if missing:
+        raise InstrumentLayoutError(f"{exchange}: instrument file has no {missing} column (keys: {sorted(keys)})")
+
+    rows = []
+    for item in items:
+        row = {"Exchange": exchange}
+        for column, aliases in INSTRUMENT_COLUMNS.items():
+            row[column] = next((item[k] for k in aliases if item.get(k) not in (None, "")), None)
+        if row["Security ID"] not in (None, 0, "0"):   # placeholder rows carry scripcode 0
+            rows.append(row)
+    if not rows:
+        raise ValueError(f"{exchange}: no instrument row has a Security ID")
+    return rows
+
+def exchange_file_path(exchange):
+    return os.path.join(SYMBOL_EXCHANGE_DIR, f"{exchange}.csv")
+
+def exchange_file_is_fresh(exchange):
+    path = exchange_file_path(exchange)
+    return os.path.exists(path) and datetime.fromtimestamp(os.path.getmtime(path)).date() == datetime.now().date()
+
+def fetch_exchange_instruments(Mofsl, userid, exchange):
+    """Download one exchange's instrument file into symbol_exchanges/<exchange>.csv; returns its row count."""
+    response = Mofsl.GetInstrumentFile(exchange, userid)
+    data = response.get("data")
+    if response.get("status") != "SUCCESS" or not isinstance(data, list):
+        raise RuntimeError(response.get("message") or "no instrument data")
+    df = pd.DataFrame(parse_instrument_rows(exchange, data), columns=["Exchange", *INSTRUMENT_COLUMNS])
+    path = exchange_file_path(exchange)
+    df.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return len(df)
+
+def build_symbol_master_from_broker(exchanges=None):
+    """Rebuild the symbol master from GetInstrumentFile, one download per exchange in parallel.
+
+    Without `exchanges`, only exchanges not fetched yet today are downloaded; named exchanges are always
+    re-fetched. Others reuse their last good file. Returns {exchange: row count or error message}.
+    """
+    sessions = mofsl_sessions.items()
+    if not sessions:
+        raise RuntimeError("No logged-in session to download instrument files")
+    _, (Mofsl, userid) = sessions[0]
+
+    wanted = [e.strip().upper() for e in exchanges] if exchanges else SYMBOL_EXCHANGES
+    to_fetch = [e for e in wanted if exchanges or not exchange_file_is_fresh(e)]
+    status = {}
+    layout_errors = []
+    with symbol_refresh_lock:
+        os.makedirs(SYMBOL_EXCHANGE_DIR, exist_ok=True)
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+                futures = {executor.submit(fetch_exchange_instruments, Mofsl, userid, e): e for e in to_fetch}
+                for future in as_completed(futures):
+                    exchange = futures[future]
+                    try:
+                        status[exchange] = future.result()
+                    except InstrumentLayoutError as e:
+                        layout_errors.append(str(e))
+                        status[exchange] = f"error: {e}"
+                    except Exception as e:
+                        status[exchange] = f"error: {e}"
+        if layout_errors:
+            # The column map or an exchange label doesn't match this API: don't mix such files into the master
+            raise InstrumentLayoutError("; ".join(layout_errors))
+        if not any(isinstance(v, int) for v in status.values()):
+            return status
+
+        frames = [
+            pd.read_csv(exchange_file_path(e))
+            for e in dict.fromkeys(SYMBOL_EXCHANGES + wanted)
+            if os.path.exists(exchange_file_path(e))
+        ]
+        tmp_csv = SYMBOL_CSV + ".tmp"
+        pd.concat(frames, ignore_index=True).to_csv(tmp_csv, index=False)
+        build_symbol_db(tmp_csv)
+        os.replace(tmp_csv, SYMBOL_CSV)
+        # The cached CSV no longer matches GitHub's validators
+        if os.path.exists(SYMBOL_META):
+            os.remove(SYMBOL_META)
+    return status
+
+def build_symbol_master_or_fallback(exchanges=None):
+    """Build from the broker's instrument files, or from the GitHub CSV when their layout is unusable.
+
+    Returns ("broker", {exchange: status}) or ("github", changed).
+    """
+    try:
+        return "broker", build_symbol_master_from_broker(exchanges)
+    except InstrumentLayoutError as e:
+        print(f"❌ Instrument files unusable, falling back to the GitHub symbol CSV: {e}")
+        return "github", recreate_sqlite_from_csv()
 
-# Recreate DB at startup (will also run in FastAPI startup event)
-recreate_sqlite_from_csv()
+def refresh_symbol_master_in_background():
+    try:
+        if SYMBOL_MASTER_SOURCE == "broker" and mofsl_sessions.items():
+            source, status = build_symbol_master_or_fallback()
+            if source == "broker":
+                print("Symbol master refreshed from instrument files:", status)
+        elif recreate_sqlite_from_csv():
+            print("✅ Symbol master refreshed from GitHub")
+        else:
+            print("Symbol master unchanged on GitHub")
+    except Exception as e:
+        print("❌ Failed to refresh symbol DB:", e)
+
+def symbol_master_refresh_loop():
+    """Refresh now, then every day at SYMBOL_REFRESH_TIME so lot sizes are current before the open."""
+    while True:
+        refresh_symbol_master_in_background()
+        now = datetime.now()
+        next_run = datetime.combine(now.date(), SYMBOL_REFRESH_TIME)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        time.sleep((next_run - now).total_seconds())
 
 # =========================
 # App & Templates
@@ -137,17 +1096,106 @@ app.add_middleware(
 def health():
     return {"ok": True}
 
+def client_userid(client):
+    return str(client.get('userid', '') or client.get('client_id', '')).strip()
+
+class ClientRepository:
+    """Client files loaded once and kept in memory (fname → dict); writes go to disk first, then the cache."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.clients = {}      # fname → client dict (replaced, never mutated)
+        self.by_userid = {}    # userid → fname
+        self.by_name = {}      # name → fname
+
+    def _ensure_loaded(self):
+        if self.loaded:
+            return
+        with self.lock:
+            if self.loaded:
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            for fname in sorted(os.listdir(self.folder)):
+                if fname.endswith(".json"):
+                    try:
+                        with open(os.path.join(self.folder, fname), "r") as f:
+                            self._index(fname, json.load(f))
+                    except Exception as e:
+                        print(f"❌ Failed to load {fname}: {e}")
+            self.loaded = True
+
+    def _index(self, fname, client):
+        self.clients[fname] = client
+        self.by_userid[client_userid(client)] = fname
+        self.by_name[client.get('name')] = fname
+
+    def _unindex(self, fname):
+        client = self.clients.pop(fname, None)
+        if client is None:
+            return
+        if self.by_userid.get(client_userid(client)) == fname:
+            del self.by_userid[client_userid(client)]
+        if self.by_name.get(client.get('name')) == fname:
+            del self.by_name[client.get('name')]
+
+    def all(self):
+        self._ensure_loaded()
+        with self.lock:
+            return list(self.clients.values())
+
+    def get_by_userid(self, userid):
+        self._ensure_loaded()
+        with self.lock:
+            fname = self.by_userid.get(str(userid).strip())
+            return self.clients.get(fname) if fname else None
+
+    def get_by_name(self, name):
+        self._ensure_loaded()
+        with self.lock:
+            fname = self.by_name.get(name)
+            return self.clients.get(fname) if fname else None
+
+    def names_by_userid(self):
+        self._ensure_loaded()
+        with self.lock:
+            return {c.get("userid"): c.get("name") for c in self.clients.values()}
+
+    def save(self, fname, client):
+        self._ensure_loaded()
+        with self.lock:
+            with open(os.path.join(self.folder, fname), "w", encoding="utf-8") as f:
+                json.dump(client, f, indent=4)
+            self._unindex(fname)
+            self._index(fname, client)
+
+    def set_session_active(self, userid, status):
+        self._ensure_loaded()
+        with self.lock:
+            fname = self.by_userid.get(str(userid).strip())
+            if not fname:
+                return
+            client = dict(self.clients[fname], session_active=status)
+            with open(os.path.join(self.folder, fname), "w") as f:
+                json.dump(client, f, indent=4)
+            self.clients[fname] = client
+
+    def delete_by_prefix(self, prefix):
+        """Remove the first client file starting with prefix; returns its fname or None."""
+        self._ensure_loaded()
+        with self.lock:
+            for fname in sorted(self.clients):
+                if fname.startswith(prefix):
+                    os.remove(os.path.join(self.folder, fname))
+                    self._unindex(fname)
+                    return fname
+        return None
+
+client_repository = ClientRepository(CLIENTS_FOLDER)
+
 def load_all_clients():
-    clients = []
-    os.makedirs(CLIENTS_FOLDER, exist_ok=True)
-    for fname in os.listdir(CLIENTS_FOLDER):
-        if fname.endswith(".json"):
-            try:
-                with open(os.path.join(CLIENTS_FOLDER, fname), "r") as f:
-                    clients.append(json.load(f))
-            except Exception as e:
-                print(f"❌ Failed to load {fname}: {e}")
-    return clients
+    return client_repository.all()
 
 def login_client(client):
     name = client.get('name')
@@ -165,7 +1213,7 @@ def login_client(client):
         Mofsl = MOFSLOPENAPI(apikey, Base_Url, None, SourceID, browsername, browserversion)
         response = Mofsl.login(userid, password, pan, totp, userid)
         if response.get("status") == "SUCCESS":
-            mofsl_sessions[name] = (Mofsl, userid)
+            mofsl_sessions.put(name, Mofsl, userid, AsyncMOFSLOPENAPI.FromSession(Mofsl))
             print(f"✅ Logged in: {name}")
             session_status = True
         else:
@@ -174,34 +1222,19 @@ def login_client(client):
         print(f"❌ Login error for {name}: {str(e)}")
 
     # Update session status in client file
-    client_file = None
-    for fname in os.listdir(CLIENTS_FOLDER):
-        if fname.endswith(".json") and userid in fname:
-            client_file = os.path.join(CLIENTS_FOLDER, fname)
-            break
-
-    if client_file:
-        try:
-            with open(client_file, "r") as f:
-                client_data = json.load(f)
-            client_data["session_active"] = session_status
-            with open(client_file, "w") as f:
-                json.dump(client_data, f, indent=4)
-        except Exception as e:
-            print(f"Could not update session_active for {client_file}: {e}")
+    try:
+        client_repository.set_session_active(userid, session_status)
+    except Exception as e:
+        print(f"Could not update session_active for {userid}: {e}")
 
 def get_client_capital(client_id):
-    for fname in os.listdir(CLIENTS_FOLDER):
-        if fname.endswith('.json'):
-            with open(os.path.join(CLIENTS_FOLDER, fname), 'r') as f:
-                client = json.load(f)
-                cid = str(client.get('userid', '') or client.get('client_id', '')).strip()
-                if cid == str(client_id):
-                    try:
-                        return float(client.get('capital', 0))
-                    except Exception:
-                        return 0
-    return 0
+    client = client_repository.get_by_userid(client_id)
+    if not client:
+        return 0
+    try:
+        return float(client.get('capital', 0))
+    except Exception:
+        return 0
 
 def auto_qty(client_id, price):
     capital = get_client_capital(client_id)
@@ -247,31 +1280,122 @@ def normalize_ordertype_copytrade(s: str) -> str:
 order_mapping = {}                  # {setup_name: {master_order_id: {child_id: child_order_id}}}
 processed_order_ids_placed = {}     # {setup_name: set()}
 processed_order_ids_canceled = {}   # {setup_name: set()}
-
-def load_active_copy_setups():
-    setups = []
-    try:
-        if not os.path.exists(COPYTRADING_FOLDER):
+copy_state_lock = threading.Lock()  # guards the processed_* sets (poll + websocket both copy)
+
+# "poll": read every master's order book each second (original behaviour)
+# "event": copy from the TradeStatus websocket push, polling only to reconcile missed pushes
+COPY_ENGINE_MODE = os.getenv("COPY_ENGINE_MODE", "poll").strip().lower()
+COPY_RECONCILE_INTERVAL = float(os.getenv("COPY_RECONCILE_INTERVAL", "3"))  # keep below COPY_MAX_ORDER_AGE
+COPY_MAX_ORDER_AGE = int(os.getenv("COPY_MAX_ORDER_AGE", "5"))              # seconds; older master orders are not copied
+MARKET_OPEN_TIME = datetime.strptime("09:00:00", "%H:%M:%S").time()         # outside this window copies go as AMO
+MARKET_CLOSE_TIME = datetime.strptime("15:30:00", "%H:%M:%S").time()
+
+COPY_SETUP_RESCAN_INTERVAL = float(os.getenv("COPY_SETUP_RESCAN_INTERVAL", "5"))  # seconds between folder mtime checks
+
+class CopySetupRegistry:
+    """In-memory copy setups (setup_id → dict), kept in step by the setup routes and an mtime watcher."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.setups = {}
+        self.mtimes = {}
+        self.unreadable = {}      # setup_id → mtime of a file that failed to parse (not retried until it changes)
+        self.active_setups = []
+        self.watcher = None
+
+    def _rebuild_active(self):
+        # Rebound, never mutated, so readers can iterate it without the lock
+        self.active_setups = [s for _, s in sorted(self.setups.items()) if s.get("enabled", False)]
+
+    def _mtime(self, setup_id):
+        try:
+            return os.stat(os.path.join(self.folder, f"{setup_id}.json")).st_mtime_ns
+        except OSError:
+            return None
+
+    def active(self):
+        return self.active_setups
+
+    def items(self):
+        with self.lock:
+            return sorted(self.setups.items())
+
+    def put(self, setup_id, data):
+        """Record a setup the caller has just written to disk."""
+        mtime = self._mtime(setup_id)
+        with self.lock:
+            self.setups[setup_id] = data
+            self.mtimes[setup_id] = mtime
+            self._rebuild_active()
+
+    def remove(self, setup_id):
+        with self.lock:
+            self.setups.pop(setup_id, None)
+            self.mtimes.pop(setup_id, None)
+            self._rebuild_active()
+
+    def rescan(self):
+        """Pick up setup files added, edited or removed outside the API (only changed files are parsed)."""
+        seen = {}
+        if os.path.exists(self.folder):
+            for fname in os.listdir(self.folder):
+                if fname.endswith('.json'):
+                    mtime = self._mtime(fname[:-5])
+                    if mtime is not None:
+                        seen[fname[:-5]] = mtime
+        else:
             print("[DEBUG] Copy trading folder missing!")
-            return []
-        for fname in os.listdir(COPYTRADING_FOLDER):
-            if fname.endswith('.json'):
+
+        with self.lock:
+            known = dict(self.mtimes)
+
+        loaded = {}
+        for setup_id, mtime in seen.items():
+            if known.get(setup_id) == mtime or self.unreadable.get(setup_id) == mtime:
+                continue
+            try:
+                with open(os.path.join(self.folder, f"{setup_id}.json"), 'r') as f:
+                    setup = json.load(f)
+                if isinstance(setup, dict):
+                    loaded[setup_id] = (setup, mtime)
+                    self.unreadable.pop(setup_id, None)
+            except Exception as e:
+                self.unreadable[setup_id] = mtime
+                print(f"[DEBUG] Failed to parse {setup_id}.json: {e}")
+
+        with self.lock:
+            # Skip entries a route changed while we were reading
+            for setup_id in list(self.setups):
+                if setup_id not in seen and self.mtimes.get(setup_id) == known.get(setup_id):
+                    self.setups.pop(setup_id, None)
+                    self.mtimes.pop(setup_id, None)
+            for setup_id, (setup, mtime) in loaded.items():
+                if self.mtimes.get(setup_id) == known.get(setup_id):
+                    self.setups[setup_id] = setup
+                    self.mtimes[setup_id] = mtime
+            self._rebuild_active()
+
+    def start_watcher(self):
+        def watch():
+            while True:
+                time.sleep(COPY_SETUP_RESCAN_INTERVAL)
                 try:
-                    with open(os.path.join(COPYTRADING_FOLDER, fname), 'r') as f:
-                        setup = json.load(f)
-                        if isinstance(setup, dict) and setup.get("enabled", False):
-                            setups.append(setup)
+                    self.rescan()
                 except Exception as e:
-                    print(f"[DEBUG] Failed to parse {fname}: {e}")
-    except Exception as e:
-        print(f"[DEBUG] Failed to load setups: {e}")
-    return setups
+                    print(f"[DEBUG] Failed to rescan setups: {e}")
+
+        if self.watcher is None:
+            self.watcher = threading.Thread(target=watch, name="copy-setup-watcher", daemon=True)
+            self.watcher.start()
+
+copy_setup_registry = CopySetupRegistry(COPYTRADING_FOLDER)
+
+def load_active_copy_setups():
+    return copy_setup_registry.active()
 
 def get_session_by_userid(userid):
-    for name, (Mofsl, uid) in mofsl_sessions.items():
-        if uid == userid:
-            return name, Mofsl, uid
-    return None, None, None
+    return mofsl_sessions.get_by_userid(userid)
 
 def fetch_master_orders(Mofsl_master, master_userid):
     try:
@@ -279,13 +1403,17 @@ def fetch_master_orders(Mofsl_master, master_userid):
         response = Mofsl_master.GetOrderBook(master_userid)
         if not response or response.get("status") != "SUCCESS":
             print(f"Failed to fetch master orders for {master_userid}: {response}")
-            return []
-        return response.get("data", [])
+            return None
+        return response.get("data") or []
     except Exception as e:
         print(f"Error fetching master orders for {master_userid}: {e}")
-        return []
+        return None
 
-def process_order(order, setup, child_accounts):
+def process_order(order, setup, child_accounts, detected_at=None):
+    """Copy one master order version to the children; False when it was already too old to copy.
+
+    detected_at is when the poll or push saw the order, so time spent queued doesn't age it.
+    """
     setup_name = setup['name']
     master_order_id = order.get("uniqueorderid")
     order_time_str = order.get("recordinserttime")
@@ -294,56 +1422,45 @@ def process_order(order, setup, child_accounts):
     if (not master_order_id or str(master_order_id) == "0" or
         not order_time_str or order_time_str in ("", "0", None)):
         print(f"[DEBUG] Skipping malformed order: {order}")
-        return
+        return True
 
     try:
         order_time_dt = datetime.strptime(order_time_str, "%d-%b-%Y %H:%M:%S")
         order_time = int(order_time_dt.timestamp())
-        if order_time_dt.time() < datetime.strptime("09:00:00", "%H:%M:%S").time() or \
-           order_time_dt.time() > datetime.strptime("15:30:00", "%H:%M:%S").time():
+        if order_time_dt.time() < MARKET_OPEN_TIME or order_time_dt.time() > MARKET_CLOSE_TIME:
             amo_flag = "Y"
         else:
             amo_flag = "N"
     except Exception as e:
         print(f"[DEBUG] Invalid recordinserttime: {order_time_str} ({e})")
-        return
+        return True
 
     order_status = (order.get("orderstatus") or "").upper()
     order_type = (order.get("ordertype") or "").upper()
 
     # Initialize maps
-    if setup_name not in processed_order_ids_placed:
-        processed_order_ids_placed[setup_name] = set()
-    if setup_name not in processed_order_ids_canceled:
-        processed_order_ids_canceled[setup_name] = set()
-    if setup_name not in order_mapping:
-        order_mapping[setup_name] = {}
+    with copy_state_lock:
+        placed_ids = processed_order_ids_placed.setdefault(setup_name, set())
+        canceled_ids = processed_order_ids_canceled.setdefault(setup_name, set())
+        order_mapping.setdefault(setup_name, {})
 
-    current_time = int(time.time())
+    current_time = int(detected_at if detected_at is not None else time.time())
 
     # Placement logic
     if order_type == "MARKET" or order_status in ("CONFIRM", "TRADED"):
-        if master_order_id in processed_order_ids_placed[setup_name]:
-            return
-        if (current_time - order_time) > 5:
-            return  # too old to copy
+        if (current_time - order_time) > COPY_MAX_ORDER_AGE:
+            return False  # too old to copy
+        # Claim the order before placing so a websocket push and a reconcile poll never both copy it
+        with copy_state_lock:
+            if master_order_id in placed_ids:
+                return True
+            placed_ids.add(master_order_id)
         print(f"[DEBUG] Copying master order {master_order_id} ({order_status}, {order_type})...")
         for child in child_accounts:
             multiplier = setup["multipliers"].get(child["userid"], 1)
 
-            # Fetch min lot qty
-            min_qty = 1
-            try:
-                with symbol_db_lock:
-                    conn = sqlite3.connect(SQLITE_DB)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT [Min Qty] FROM symbols WHERE [Security ID]=?", (order.get("symboltoken"),))
-                    result = cursor.fetchone()
-                    if result and result[0]:
-                        min_qty = int(result[0])
-                    conn.close()
-            except Exception as e:
-                print(f"[DEBUG] Failed to fetch min_qty for {order.get('symboltoken')}: {e}")
+            # Min lot qty from the in-memory index
+            min_qty = get_min_qty(order.get("symboltoken"))
 
             master_qty = int(order.get("orderqty", 1))
             total_qty = master_qty * multiplier
@@ -384,18 +1501,19 @@ def process_order(order, setup, child_accounts):
                 print(f"[DEBUG] Exception placing child order for {uid_child}: {e}")
                 log_message(child["name"], f"[CopyTrading] Exception: {e}")
 
-        processed_order_ids_placed[setup_name].add(master_order_id)
-
     # Cancel logic
     elif order_status == "CANCEL":
-        if master_order_id in processed_order_ids_canceled[setup_name] or (current_time - order_time) > 5:
-            return
+        if (current_time - order_time) > COPY_MAX_ORDER_AGE:
+            return False
+        with copy_state_lock:
+            if master_order_id in canceled_ids:
+                return True
+            canceled_ids.add(master_order_id)
         print(f"[DEBUG] Master order {master_order_id} CANCEL detected. Propagating...")
         child_orders = order_mapping.get(setup_name, {}).get(master_order_id, {})
         if not child_orders:
             print(f"[DEBUG] No mapping found for master order {master_order_id} in setup {setup_name}")
-            processed_order_ids_canceled[setup_name].add(master_order_id)
-            return
+            return True
 
         for uid_child, child_order_id in child_orders.items():
             _, Mofsl_child, _ = get_session_by_userid(uid_child)
@@ -407,45 +1525,319 @@ def process_order(order, setup, child_accounts):
                 print(f"[DEBUG] Cancel response for child {uid_child}: {resp}")
             except Exception as e:
                 print(f"[DEBUG] Exception during cancel for child {uid_child}: {e}")
-        processed_order_ids_canceled[setup_name].add(master_order_id)
+    return True
+
+def build_child_accounts(setup):
+    child_accounts = []
+    for cid in setup.get('children') or []:
+        name, _, uid = get_session_by_userid(cid)
+        if name:
+            child_accounts.append({"userid": uid, "name": name})
+    return child_accounts
+
+# --- Incremental master order-book tracking ---
+# A version is recorded only once its copy job finished, so failed or dropped jobs are diffed again next tick
+master_order_fingerprints = {}      # {(master_userid, setup_name): {master_order_id: fingerprint}}
+master_order_pending = {}           # same shape, versions queued on the worker pool but not finished yet
+master_order_fingerprints_lock = threading.Lock()
+
+def order_fingerprint(order):
+    return (
+        order.get("orderstatus"), order.get("ordertype"), order.get("orderqty"),
+        order.get("price"), order.get("triggerprice"), order.get("recordinserttime"),
+    )
+
+def diff_master_orders(book_key, master_orders):
+    """Return the orders new or changed since the last copied version for this (master, setup).
+
+    Ids that are no longer in the book are dropped, so the table only holds the current book.
+    """
+    changed = []
+    current = set()
+    with master_order_fingerprints_lock:
+        seen = master_order_fingerprints.setdefault(book_key, {})
+        pending = master_order_pending.setdefault(book_key, {})
+        for order in master_orders:
+            if not isinstance(order, dict):
+                continue
+            master_order_id = order.get("uniqueorderid")
+            if not master_order_id:
+                continue
+            current.add(master_order_id)
+            fingerprint = order_fingerprint(order)
+            if seen.get(master_order_id) != fingerprint and pending.get(master_order_id) != fingerprint:
+                pending[master_order_id] = fingerprint
+                changed.append(order)
+        for table in (seen, pending):
+            for master_order_id in [oid for oid in table if oid not in current]:
+                del table[master_order_id]
+    return changed
+
+def finish_master_order(book_key, order, succeeded):
+    """Settle a queued order version: record it when the copy job succeeded, otherwise leave it to be retried."""
+    master_order_id = order.get("uniqueorderid")
+    fingerprint = order_fingerprint(order)
+    with master_order_fingerprints_lock:
+        pending = master_order_pending.get(book_key, {})
+        if pending.get(master_order_id) == fingerprint:
+            del pending[master_order_id]
+        if succeeded:
+            master_order_fingerprints.setdefault(book_key, {})[master_order_id] = fingerprint
+
+def prune_master_order_books(active_keys):
+    """Forget the tracked books of (master, setup) pairs that are no longer copying."""
+    with master_order_fingerprints_lock:
+        for table in (master_order_fingerprints, master_order_pending):
+            for book_key in [k for k in table if k not in active_keys]:
+                del table[book_key]
+
+# --- Copy engine worker pool ---
+COPY_WORKERS = int(os.getenv("COPY_WORKERS", "16"))              # threads placing/cancelling child orders
+COPY_FETCH_WORKERS = int(os.getenv("COPY_FETCH_WORKERS", "8"))   # threads fetching master order books
+COPY_QUEUE_SIZE = int(os.getenv("COPY_QUEUE_SIZE", "500"))       # pending jobs per worker
+COPY_QUEUE_TIMEOUT = float(os.getenv("COPY_QUEUE_TIMEOUT", "2")) # seconds submit waits on a full queue before dropping the job
+
+class CopyWorkerPool:
+    """Long-lived worker threads, each draining its own bounded queue of (setup, order, child_accounts, book_key, detected_at) jobs.
+
+    Jobs are sharded by (setup, master order id), so the placement and the cancel of one master order for a
+    setup run in submission order on the same worker and a cancel never reads the child mapping mid-placement,
+    while other setups copying the same order run on other workers.
+    When book_key is set the order version is settled in the master order-book tracking once the job ends.
+    A job whose queue stays full for put_timeout is dropped and left pending for the next reconcile tick.
+    """
+
+    def __init__(self, workers, queue_size, put_timeout):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.put_timeout = put_timeout
+        self.queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self.lock = threading.Lock()
+        self.threads = []
+        self.busy = 0
+        self.busy_seconds = 0.0
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.stale = 0
+        self.max_queue_depth = 0
+        self.started_at = None
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            self.started_at = time.monotonic()
+            for i, jobs in enumerate(self.queues):
+                t = threading.Thread(target=self._run, args=(jobs,), name=f"copy-worker-{i}", daemon=True)
+                t.start()
+                self.threads.append(t)
+
+    def shard(self, setup_name, master_order_id):
+        return self.queues[hash((setup_name, str(master_order_id))) % self.workers]
+
+    def submit(self, setup, order, child_accounts, book_key=None, detected_at=None):
+        """Queue a copy job; returns False when the job was dropped because its queue stayed full."""
+        if detected_at is None:
+            detected_at = time.time()
+        jobs = self.shard(setup.get("name"), order.get("uniqueorderid"))
+        try:
+            jobs.put((setup, order, child_accounts, book_key, detected_at), timeout=self.put_timeout)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            print(f"[DEBUG] Copy queue full, dropped order {order.get('uniqueorderid')} for setup {setup.get('name')}")
+            if book_key is not None:
+                finish_master_order(book_key, order, False)
+            return False
+        with self.lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, jobs.qsize())
+        return True
+
+    def _run(self, jobs):
+        while True:
+            setup, order, child_accounts, book_key, detected_at = jobs.get()
+            with self.lock:
+                self.busy += 1
+            started = time.monotonic()
+            failed = False
+            stale = False
+            try:
+                stale = process_order(order, setup, child_accounts, detected_at) is False
+            except Exception as e:
+                failed = True
+                print(f"[DEBUG] Copy worker error for order {order.get('uniqueorderid')}: {e}")
+            finally:
+                # A stale skip is settled too: its age was measured at detection, so a retry can't copy it
+                if book_key is not None:
+                    finish_master_order(book_key, order, not failed)
+                with self.lock:
+                    self.busy -= 1
+                    self.busy_seconds += time.monotonic() - started
+                    self.processed += 1
+                    if failed:
+                        self.failed += 1
+                    if stale:
+                        self.stale += 1
+                jobs.task_done()
+
+    def metrics(self):
+        with self.lock:
+            uptime = (time.monotonic() - self.started_at) if self.started_at else 0.0
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "queue_depth": sum(jobs.qsize() for jobs in self.queues),
+                "max_queue_depth": self.max_queue_depth,
+                "busy_workers": self.busy,
+                "utilisation": round(self.busy / self.workers, 3),
+                "avg_utilisation": round(self.busy_seconds / (uptime * self.workers), 3) if uptime else 0.0,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "stale": self.stale,     # already older than COPY_MAX_ORDER_AGE when detected
+            }
+
+copy_worker_pool = CopyWorkerPool(COPY_WORKERS, COPY_QUEUE_SIZE, COPY_QUEUE_TIMEOUT)
+master_fetch_executor = ThreadPoolExecutor(max_workers=COPY_FETCH_WORKERS, thread_name_prefix="copy-fetch")
 
 def synchronize_orders():
     setups = load_active_copy_setups()
-    threads = []
-
-    def handle_setup(setup):
-        master_id = setup['master']
-        child_ids = setup.get('children') or []
-        # Build child info list
-        child_accounts = []
-        for cid in child_ids:
-            name, _, uid = get_session_by_userid(cid)
-            if name:
-                child_accounts.append({"userid": uid, "name": name})
 
+    # One order-book fetch per master, shared by every setup that copies it
+    setups_by_master = {}
+    for setup in setups:
+        setups_by_master.setdefault(setup['master'], []).append(setup)
+
+    def handle_master(master_id, master_setups):
         name_master, Mofsl_master, uid_master = get_session_by_userid(master_id)
         if not Mofsl_master:
             print(f"❌ Master session not found for {master_id}")
             return
 
-        master_orders = fetch_master_orders(Mofsl_master, uid_master) or []
-        order_threads = []
-        for order in master_orders:
-            t = threading.Thread(target=process_order, args=(order, setup, child_accounts))
-            t.start()
-            order_threads.append(t)
-        for t in order_threads:
-            t.join()
+        master_orders = fetch_master_orders(Mofsl_master, uid_master)
+        if master_orders is None:
+            return  # keep the tracked book until a fetch succeeds
+        detected_at = time.time()
 
-    for setup in setups:
-        t = threading.Thread(target=handle_setup, args=(setup,))
-        t.start()
-        threads.append(t)
-    for t in threads:
-        t.join()
+        for setup in master_setups:
+            book_key = (master_id, setup['name'])
+            changed_orders = diff_master_orders(book_key, master_orders)
+            if not changed_orders:
+                continue
+            # Build child info list
+            child_accounts = build_child_accounts(setup)
+            for order in changed_orders:
+                copy_worker_pool.submit(setup, order, child_accounts, book_key, detected_at)
+
+    # Wait for the fetches only; copy jobs keep running on the worker pool
+    list(master_fetch_executor.map(lambda item: handle_master(*item), setups_by_master.items()))
+    prune_master_order_books(set((s['master'], s['name']) for s in setups))
+
+# --- Event-driven copy (TradeStatus websocket) ---
+trade_status_masters = {}           # {master_userid: Mofsl} with an open order-update socket
+trade_status_lock = threading.Lock()
+# Order-book fields process_order relies on; pushes missing any are resolved from GetOrderBook
+TRADE_STATUS_ORDER_FIELDS = ("uniqueorderid", "recordinserttime", "orderstatus", "ordertype", "symboltoken", "buyorsell", "orderqty")
+
+def parse_trade_status_orders(message):
+    """Return the order dicts carried by a TradeStatus push (single order or list, bare or under "data")."""
+    try:
+        payload = json.loads(message) if isinstance(message, (str, bytes, bytearray)) else message
+    except Exception:
+        return []
+    if isinstance(payload, dict) and "data" in payload:
+        payload = payload["data"]
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        return []
+    return [o for o in payload if isinstance(o, dict) and o.get("uniqueorderid")]
+
+def submit_master_orders(master_userid, orders, detected_at):
+    for setup in load_active_copy_setups():
+        if setup.get('master') != master_userid:
+            continue
+        child_accounts = build_child_accounts(setup)
+        for order in orders:
+            copy_worker_pool.submit(setup, order, child_accounts, (master_userid, setup['name']), detected_at)
+
+def resolve_trade_status_orders(master_userid, Mofsl_master, order_ids, detected_at):
+    """Copy pushed orders that lacked order-book fields from their GetOrderBook rows (runs on master_fetch_executor)."""
+    book = fetch_master_orders(Mofsl_master, master_userid)
+    if book is None:
+        return  # the reconcile tick picks them up
+    resolved = [o for o in book if isinstance(o, dict) and o.get("uniqueorderid") in order_ids]
+    if resolved:
+        submit_master_orders(master_userid, resolved, detected_at)
+
+def on_master_order_update(master_userid, Mofsl_master, message):
+    """Hand a TradeStatus push to the copy workers; the websocket reader never waits on the broker."""
+    orders = parse_trade_status_orders(message)
+    if not orders:
+        return
+    detected_at = time.time()
+    incomplete = set(o["uniqueorderid"] for o in orders if any(o.get(f) in (None, "") for f in TRADE_STATUS_ORDER_FIELDS))
+    complete = [o for o in orders if o["uniqueorderid"] not in incomplete]
+    if complete:
+        submit_master_orders(master_userid, complete, detected_at)
+    if incomplete:
+        print(f"[DEBUG] TradeStatus push for {master_userid} lacks order-book fields "
+              f"({len(incomplete)} orders), falling back to GetOrderBook")
+        master_fetch_executor.submit(resolve_trade_status_orders, master_userid, Mofsl_master, incomplete, detected_at)
+
+def subscribe_master_order_updates(master_userid, Mofsl):
+    def on_open(ws2):
+        Mofsl.Tradelogin()
+        Mofsl.OrderSubscribe()
+        Mofsl.TradeSubscribe()
+
+    def on_message(ws2, message_type, message):
+        try:
+            on_master_order_update(master_userid, Mofsl, message)
+        except Exception as e:
+            print(f"[DEBUG] TradeStatus message error for {master_userid}: {e}")
+
+    def on_close(ws2, close_status_code, close_msg):
+        print(f"[DEBUG] TradeStatus closed for master {master_userid}: {close_msg}")
+        with trade_status_lock:
+            if trade_status_masters.get(master_userid) is Mofsl:
+                trade_status_masters.pop(master_userid, None)
+
+    Mofsl._TradeStatus_on_open = on_open
+    Mofsl._TradeStatus_on_message = on_message
+    Mofsl._TradeStatus_on_close = on_close
+    Mofsl.TradeStatusHeartbeat_flag = True
+    # ensure_trade_status_subscriptions reopens dropped sockets; an SDK reconnect on top would open a second one
+    Mofsl.TradeStatusAutoReconnect_flag = False
+    Mofsl.TradeStatus_connect()
+
+def ensure_trade_status_subscriptions(setups):
+    """Open one TradeStatus socket per enabled master; dropped sockets are reopened on the next tick.
+
+    This loop is the only reconnect owner: the SDK's own reconnect is switched off for these sockets.
+    """
+    for master_id in set(s.get('master') for s in setups):
+        _, Mofsl_master, uid_master = get_session_by_userid(master_id)
+        if not Mofsl_master:
+            continue
+        with trade_status_lock:
+            if trade_status_masters.get(uid_master) is Mofsl_master:
+                continue
+            trade_status_masters[uid_master] = Mofsl_master
+        print(f"[DEBUG] Subscribing to order updates for master {uid_master}")
+        try:
+            subscribe_master_order_updates(uid_master, Mofsl_master)
+        except Exception as e:
+            print(f"[DEBUG] TradeStatus subscribe failed for {uid_master}: {e}")
+            with trade_status_lock:
+                trade_status_masters.pop(uid_master, None)
 
 def motilal_copy_trading_loop():
-    print("Motilal Copy Trading Engine running...")
+    print(f"Motilal Copy Trading Engine running ({COPY_ENGINE_MODE} mode)...")
     last_enabled = set()
     while True:
         try:
@@ -457,8 +1849,13 @@ def motilal_copy_trading_loop():
                 print(f"[DEBUG] Copy Trading DISABLED for setup: {sname}")
             last_enabled = enabled_now
 
-            synchronize_orders()
-            time.sleep(1)  # 1 sec refresh
+            if COPY_ENGINE_MODE == "event":
+                ensure_trade_status_subscriptions(setups)
+                synchronize_orders()  # reconcile pushes that never arrived
+                time.sleep(COPY_RECONCILE_INTERVAL)
+            else:
+                synchronize_orders()
+                time.sleep(1)  # 1 sec refresh
         except Exception as e:
             print("Error in synchronization:", str(e))
 
@@ -467,9 +1864,11 @@ def motilal_copy_trading_loop():
 # =========================
 @app.on_event("startup")
 def on_startup():
-    # Build/refresh symbols DB
+    # Serve the cached symbol master straight away and refresh it in the background.
+    # Lot sizes must be loaded before the copy loop starts, so a first boot with no cache still builds inline.
     try:
-        recreate_sqlite_from_csv()
+        if not load_symbol_snapshot():
+            recreate_sqlite_from_csv()
     except Exception as e:
         print("❌ Failed to init symbol DB:", e)
 
@@ -479,7 +1878,22 @@ def on_startup():
         with ThreadPoolExecutor(max_workers=20) as executor:
             list(executor.map(login_client, all_clients))
 
-    # Start background copy-trading loop (daemon thread)
+    # After logins, so the broker source has a session to download instrument files with
+    threading.Thread(target=symbol_master_refresh_loop, daemon=True).start()
+
+    if MARKET_FEED:
+        try:
+            market_feed.start(MARKET_FEED_CLIENT)
+        except Exception as e:
+            print(f"❌ Failed to start market feed: {e}")
+
+    # Start background copy-trading loop (daemon thread) and its worker pool
+    try:
+        copy_setup_registry.rescan()
+    except Exception as e:
+        print(f"[DEBUG] Failed to load setups: {e}")
+    copy_setup_registry.start_watcher()
+    copy_worker_pool.start()
     threading.Thread(target=motilal_copy_trading_loop, daemon=True).start()
 
     # Optionally open browser to index page
@@ -490,21 +1904,27 @@ def on_startup():
             pass
     #threading.Timer(1.5, open_browser).start()
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await CloseAsyncHttpClient()
+
 # =========================
 # Routes (ported 1:1)
 # =========================
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
     try:
-        conn = sqlite3.connect(SQLITE_DB)
-        cur = conn.execute(f"SELECT DISTINCT [Stock Symbol] FROM {TABLE_NAME}")
-        symbols = [row[0] for row in cur.fetchall()]
-        conn.close()
+        symbols, _ = symbol_snapshot.distinct_symbols()
         clients = load_all_clients()
         return templates.TemplateResponse("index.html", {"request": request, "symbols": symbols, "clients": clients})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal Error: {e}")
 
+@app.get("/get_symbols")
+def get_symbols():
+    _, symbols_json = symbol_snapshot.distinct_symbols()
+    return Response(content=symbols_json, media_type="application/json")
+
 @app.get("/search_symbols")
 def search_symbols(q: str = Query("", alias="q"), exchange: str = Query("", alias="exchange")):
     query = (q or "").strip()
@@ -517,30 +1937,37 @@ def search_symbols(q: str = Query("", alias="q"), exchange: str = Query("", alia
     if not words:
         return JSONResponse(content={"results": []})
 
-    where_clauses = []
-    params = []
-    for w in words:
-        where_clauses.append("LOWER([Stock Symbol]) LIKE ?")
-        params.append(f"%{w}%")
+    snap = symbol_snapshot
 
-    where_sql = " AND ".join(where_clauses)
-    if exchange_filter:
-        where_sql += " AND UPPER(Exchange) = ?"
-        params.append(exchange_filter)
+    def run_search(limit):
+        if snap.search_index is not None:
+            return snap.search_index.search(words, exchange_filter, limit)
 
-    sql = f"""
-        SELECT Exchange, [Stock Symbol], [Security ID]
-        FROM {TABLE_NAME}
-        WHERE {where_sql}
-        ORDER BY [Stock Symbol]
-        LIMIT 20
-    """
+        if SYMBOL_SEARCH_BACKEND == "fts" and snap.fts_ready:
+            sql, params = fts_search_sql(words, exchange_filter)
+        else:
+            where_clauses = []
+            params = []
+            for w in words:
+                where_clauses.append("LOWER([Stock Symbol]) LIKE ?")
+                params.append(f"%{w}%")
 
-    with symbol_db_lock:
-        conn = sqlite3.connect(SQLITE_DB)
-        cur = conn.execute(sql, params)
-        rows = cur.fetchall()
-        conn.close()
+            where_sql = " AND ".join(where_clauses)
+            if exchange_filter:
+                where_sql += " AND UPPER(Exchange) = ?"
+                params.append(exchange_filter)
+
+            sql = f"""
+                SELECT Exchange, [Stock Symbol], [Security ID]
+                FROM {TABLE_NAME}
+                WHERE {where_sql}
+                ORDER BY [Stock Symbol]
+                LIMIT 20
+            """
+
+        return get_symbol_db(snap).execute(sql, params).fetchall()
+
+    rows = symbol_search_cache.search(snap, words, exchange_filter, run_search)
 
     results = [
         {"id": f"{row[0]}|{row[1]}|{row[2]}", "text": f"{row[0]} | {row[1]}"}
@@ -549,7 +1976,7 @@ def search_symbols(q: str = Query("", alias="q"), exchange: str = Query("", alia
     return JSONResponse(content={"results": results})
 
 @app.post("/add_client")
-async def add_client(
+def add_client(
     background_tasks: BackgroundTasks,
     payload: dict = Body(...)
 ):
@@ -561,12 +1988,10 @@ async def add_client(
 
     safe_name = name.replace(" ", "_")
     filename = f"{safe_name}_{userid}.json"
-    filepath = os.path.join(CLIENTS_FOLDER, filename)
 
     try:
         # 1️⃣ Save locally (runtime source of truth)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=4)
+        client_repository.save(filename, payload)
 
         # 2️⃣ Mirror to GitHub (persistence)
         github_write_file(
@@ -591,35 +2016,30 @@ async def add_client(
 def get_clients():
     clients = []
 
-    if not os.path.exists(CLIENTS_FOLDER):
-        return {"clients": []}
-
-    for fname in os.listdir(CLIENTS_FOLDER):
-        if not fname.endswith(".json"):
-            continue
-
-        try:
-            with open(os.path.join(CLIENTS_FOLDER, fname), "r", encoding="utf-8") as f:
-                client = json.load(f)
-
-            clients.append({
-                "name": client.get("name", ""),
-                "client_id": client.get("userid", ""),
-                "capital": client.get("capital", ""),
-                "session": "Logged in" if client.get("session_active") else "Logged out"
-            })
-
-        except Exception:
-            continue
+    for client in client_repository.all():
+        clients.append({
+            "name": client.get("name", ""),
+            "client_id": client.get("userid", ""),
+            "capital": client.get("capital", ""),
+            "session": "Logged in" if client.get("session_active") else "Logged out"
+        })
 
     return {"clients": clients}
 
 
 @app.post("/refresh_symbols")
-def refresh_symbols():
+def refresh_symbols(exchanges: str = Query("", alias="exchanges")):
     try:
-        update_symbol_db_from_github()
-        return {"status": "success", "message": "Symbol master refreshed from GitHub."}
+        if SYMBOL_MASTER_SOURCE == "broker":
+            # e.g. ?exchanges=NSEFO,MCX re-fetches just those; empty refreshes whatever is stale today
+            wanted = [e for e in exchanges.split(",") if e.strip()] or None
+            source, status = build_symbol_master_or_fallback(wanted)
+            if source == "github":
+                return {"status": "success", "message": "Instrument files unusable, symbol master refreshed from GitHub."}
+            return {"status": "success", "message": "Symbol master refreshed from instrument files.", "exchanges": status}
+        if update_symbol_db_from_github():
+            return {"status": "success", "message": "Symbol master refreshed from GitHub."}
+        return {"status": "success", "message": "Symbol master already up to date."}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -652,16 +2072,13 @@ async def place_order(payload: dict = Body(...)):
     amoorder = data.get("amoorder", "N")
 
     responses = {}
-    threads = []
-    thread_lock = threading.Lock()
-
-    def place_order_for_client(tag, client_id, this_qty):
-        session = next(((Mofsl, userid) for name, (Mofsl, userid) in mofsl_sessions.items() if userid == client_id), None)
-        if not session:
-            with thread_lock:
-                responses[f"{tag}:{client_id}" if tag else client_id] = {"status": "ERROR", "message": "Session not found"}
+
+    async def place_order_for_client(tag, client_id, this_qty):
+        name, _, userid = mofsl_sessions.get_by_userid(client_id)
+        AsyncMofsl = mofsl_sessions.get_async(name)
+        if not AsyncMofsl:
+            responses[f"{tag}:{client_id}" if tag else client_id] = {"status": "ERROR", "message": "Session not found"}
             return
-        Mofsl, userid = session
 
         order_payload = {
             "clientcode": client_id,
@@ -682,53 +2099,58 @@ async def place_order(payload: dict = Body(...)):
         }
         print(f"🛒 Order payload for {tag}-{client_id}:", order_payload)
         try:
-            response = Mofsl.PlaceOrder(order_payload)
+            response = await AsyncMofsl.PlaceOrder(order_payload)
         except Exception as e:
             response = {"status": "ERROR", "message": str(e)}
 
-        with thread_lock:
-            responses[f"{tag}:{client_id}" if tag else client_id] = response
-
-    if groupacc:
-        group_client_pairs = []
-        for group_name in groups:
-            group_file = os.path.join(GROUPS_FOLDER, f"{group_name.replace(' ', '_')}.json")
-            if not os.path.exists(group_file):
-                responses[group_name] = {"status": "ERROR", "message": f"Group file not found for {group_name}"}
-                continue
-            with open(group_file, 'r') as f:
-                group_data = json.load(f)
-                group_clients = group_data.get("clients", [])
-                group_multiplier = int(group_data.get("multiplier", 1))
-                for client_id in group_clients:
-                    if qtySelection == "auto":
-                        qty = auto_qty(client_id, price)
-                    elif diffQty:
-                        qty = int(perGroupQty.get(group_name, 0))
-                    elif multiplier:
-                        qty = quantityinlot * group_multiplier
-                    else:
-                        qty = quantityinlot
-                    threads.append(threading.Thread(target=place_order_for_client, args=(group_name, client_id, qty)))
-    else:
-        for client_id in clients:
-            if qtySelection == "auto":
-                qty = auto_qty(client_id, price)
-            elif diffQty:
-                qty = int(perClientQty.get(str(client_id), 0))
-            else:
-                qty = quantityinlot
-            threads.append(threading.Thread(target=place_order_for_client, args=(None, client_id, qty)))
+        responses[f"{tag}:{client_id}" if tag else client_id] = response
+
+    # Market orders carry no price; size auto-qty from the streamed LTP when there is one
+    auto_price = price
+    if qtySelection == "auto" and price <= 0:
+        auto_price = live_ltp(exchange_val or exchange, symboltoken) or price
+
+    # Group files and auto-qty capital lookups touch disk: resolve them in the threadpool
+    def build_targets():
+        targets = []
+        if groupacc:
+            for group_name in groups:
+                group_file = os.path.join(GROUPS_FOLDER, f"{group_name.replace(' ', '_')}.json")
+                if not os.path.exists(group_file):
+                    responses[group_name] = {"status": "ERROR", "message": f"Group file not found for {group_name}"}
+                    continue
+                with open(group_file, 'r') as f:
+                    group_data = json.load(f)
+                    group_clients = group_data.get("clients", [])
+                    group_multiplier = int(group_data.get("multiplier", 1))
+                    for client_id in group_clients:
+                        if qtySelection == "auto":
+                            qty = auto_qty(client_id, auto_price)
+                        elif diffQty:
+                            qty = int(perGroupQty.get(group_name, 0))
+                        elif multiplier:
+                            qty = quantityinlot * group_multiplier
+                        else:
+                            qty = quantityinlot
+                        targets.append((group_name, client_id, qty))
+        else:
+            for client_id in clients:
+                if qtySelection == "auto":
+                    qty = auto_qty(client_id, auto_price)
+                elif diffQty:
+                    qty = int(perClientQty.get(str(client_id), 0))
+                else:
+                    qty = quantityinlot
+                targets.append((None, client_id, qty))
+        return targets
 
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
+    targets = await run_in_threadpool(build_targets)
+    await asyncio.gather(*(place_order_for_client(tag, client_id, qty) for tag, client_id, qty in targets))
 
     return {"status": "completed", "order_responses": responses}
 
 @app.get("/get_orders")
-def get_orders():
+async def get_orders():
     orders_data = OrderedDict({
         "pending": [],
         "traded": [],
@@ -737,11 +2159,24 @@ def get_orders():
         "others": []
     })
 
-    for name, (Mofsl, userid) in mofsl_sessions.items():
+    async def fetch_order_book(name, userid):
+        AsyncMofsl = mofsl_sessions.get_async(name)
+        if not AsyncMofsl:
+            return None
+        today_date = datetime.now().strftime("%d-%b-%Y 09:00:00")
+        order_book_info = {"clientcode": userid, "datetimestamp": today_date}
+        return await AsyncMofsl.GetOrderBook(order_book_info)
+
+    sessions = mofsl_sessions.items()
+    books = await asyncio.gather(
+        *(fetch_order_book(name, userid) for name, (Mofsl, userid) in sessions),
+        return_exceptions=True
+    )
+
+    for (name, (Mofsl, userid)), response in zip(sessions, books):
         try:
-            today_date = datetime.now().strftime("%d-%b-%Y 09:00:00")
-            order_book_info = {"clientcode": userid, "datetimestamp": today_date}
-            response = Mofsl.GetOrderBook(order_book_info)
+            if isinstance(response, Exception):
+                raise response
             if response and response.get("status") != "SUCCESS":
                 logging.error(f"❌ Error fetching orders for {name}: {response.get('message', 'No message')}")
 
@@ -795,17 +2230,21 @@ def get_positions():
                 buy_avg = (pos.get("buyamount", 0) / max(1, pos.get("buyquantity", 1))) if pos.get("buyquantity", 0) > 0 else 0
                 sell_avg = (pos.get("sellamount", 0) / max(1, pos.get("sellquantity", 1))) if pos.get("sellquantity", 0) > 0 else 0
 
-                net_profit = (
-                    (pos.get("LTP", 0) - buy_avg) * quantity if quantity > 0
-                    else (sell_avg - buy_avg) * abs(quantity) if quantity < 0
-                    else booked_profit
-                )
-
                 symbol = pos.get("symbol", "")
                 exchange = pos.get("exchange", "")
                 symboltoken = pos.get("symboltoken", "")
                 producttype = pos.get("productname", "")
 
+                # Streamed price when the feed has it, else the LTP the positions call returned
+                ltp = live_ltp(exchange, symboltoken) if quantity != 0 else None
+                if ltp is None:
+                    ltp = pos.get("LTP", 0)
+                net_profit = (
+                    (ltp - buy_avg) * quantity if quantity > 0
+                    else (sell_avg - buy_avg) * abs(quantity) if quantity < 0
+                    else booked_profit
+                )
+
                 if quantity != 0:
                     position_meta[(name, symbol)] = {
                         "exchange": exchange,
@@ -838,42 +2277,32 @@ async def cancel_order(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="❌ No orders received for cancellation.")
 
     response_messages = []
-    threads = []
-    thread_lock = threading.Lock()
 
-    def cancel_single_order(order):
+    async def cancel_single_order(order):
         name = order.get("name")
         order_id = order.get("order_id")
         if not name or not order_id:
-            with thread_lock:
-                response_messages.append(f"❌ Missing data in order: {order}")
+            response_messages.append(f"❌ Missing data in order: {order}")
             return
 
         session = mofsl_sessions.get(name)
-        if not session:
-            with thread_lock:
-                response_messages.append(f"❌ Session not found for: {name}")
+        AsyncMofsl = mofsl_sessions.get_async(name)
+        if not session or not AsyncMofsl:
+            response_messages.append(f"❌ Session not found for: {name}")
             return
 
         Mofsl, userid = session
         try:
-            cancel_response = Mofsl.CancelOrder(order_id, userid)
+            cancel_response = await AsyncMofsl.CancelOrder(order_id, userid)
             message = (cancel_response.get("message", "") or "").lower()
-            with thread_lock:
-                if "cancel order request sent" in message:
-                    response_messages.append(f"✅ Cancelled Order {order_id} for {name}")
-                else:
-                    response_messages.append(f"❌ Failed to cancel Order {order_id} for {name}: {cancel_response.get('message', '')}")
+            if "cancel order request sent" in message:
+                response_messages.append(f"✅ Cancelled Order {order_id} for {name}")
+            else:
+                response_messages.append(f"❌ Failed to cancel Order {order_id} for {name}: {cancel_response.get('message', '')}")
         except Exception as e:
-            with thread_lock:
-                response_messages.append(f"❌ Error cancelling {order_id} for {name}: {str(e)}")
+            response_messages.append(f"❌ Error cancelling {order_id} for {name}: {str(e)}")
 
-    for order in orders:
-        t = threading.Thread(target=cancel_single_order, args=(order,))
-        t.start()
-        threads.append(t)
-    for t in threads:
-        t.join()
+    await asyncio.gather(*(cancel_single_order(order) for order in orders))
 
     return {"message": response_messages}
 
@@ -882,23 +2311,8 @@ async def close_position(payload: dict = Body(...)):
     data = payload
     positions = data.get("positions", [])
     messages = []
-    threads = []
-    thread_lock = threading.Lock()
 
-    # Load min qty map once
-    conn = sqlite3.connect(SQLITE_DB)
-    cursor = conn.cursor()
-    min_qty_map = {}
-    try:
-        cursor.execute("SELECT [Security ID], [Min Qty] FROM symbols")
-        for sid, qty in cursor.fetchall():
-            if sid:
-                min_qty_map[str(sid)] = int(qty) if qty else 1
-    except Exception as e:
-        print(f"❌ Error reading min_qty from DB: {e}")
-    conn.close()
-
-    def close_single_position(pos):
+    async def close_single_position(pos):
         name = pos.get("name")
         symbol = pos.get("symbol")
         quantity = float(pos.get("quantity", 0))
@@ -906,14 +2320,14 @@ async def close_position(payload: dict = Body(...)):
 
         meta = position_meta.get((name, symbol))
         session_data = mofsl_sessions.get(name)
-        if not meta or not session_data:
-            with thread_lock:
-                messages.append(f"❌ Missing data for {name} - {symbol}")
+        AsyncMofsl = mofsl_sessions.get_async(name)
+        if not meta or not session_data or not AsyncMofsl:
+            messages.append(f"❌ Missing data for {name} - {symbol}")
             return
 
         Mofsl, userid = session_data
         symboltoken = meta.get("symboltoken")
-        min_qty = min_qty_map.get(str(symboltoken), 1)
+        min_qty = get_min_qty(symboltoken)
         lots = max(1, int(quantity // min_qty)) if min_qty > 0 else int(quantity)
 
         order = {
@@ -934,23 +2348,15 @@ async def close_position(payload: dict = Body(...)):
             "tag": ""
         }
         try:
-            response = Mofsl.PlaceOrder(order)
+            response = await AsyncMofsl.PlaceOrder(order)
             if response.get("status") == "SUCCESS":
-                with thread_lock:
-                    messages.append(f"✅ Closed: {name} - {symbol}")
+                messages.append(f"✅ Closed: {name} - {symbol}")
             else:
-                with thread_lock:
-                    messages.append(f"❌ Failed: {name} - {symbol} - {response.get('message', 'Unknown')}")
+                messages.append(f"❌ Failed: {name} - {symbol} - {response.get('message', 'Unknown')}")
         except Exception as e:
-            with thread_lock:
-                messages.append(f"❌ Error for {name} - {symbol}: {str(e)}")
+            messages.append(f"❌ Error for {name} - {symbol}: {str(e)}")
 
-    for pos in positions:
-        t = threading.Thread(target=close_single_position, args=(pos,))
-        t.start()
-        threads.append(t)
-    for t in threads:
-        t.join()
+    await asyncio.gather(*(close_single_position(pos) for pos in positions))
 
     return {"message": messages}
 
@@ -977,10 +2383,8 @@ async def convert_position(payload: dict = Body(...)):
         raise HTTPException(status_code=400, detail="No positions received for conversion.")
 
     messages = []
-    threads = []
-    thread_lock = threading.Lock()
 
-    def convert_single(pos):
+    async def convert_single(pos):
         name = (pos.get("name") or "").strip()
         symbol = (pos.get("symbol") or "").strip()
         quantity = int(pos.get("quantity") or 0)
@@ -989,17 +2393,16 @@ async def convert_position(payload: dict = Body(...)):
         newproduct = (pos.get("newproduct") or "DELIVERY").upper()
 
         if not name or not symbol or quantity <= 0:
-            with thread_lock:
-                messages.append(f"❌ Invalid data for position: {pos}")
+            messages.append(f"❌ Invalid data for position: {pos}")
             return
 
         # lookup session and symbol meta captured by /get_positions
         meta = position_meta.get((name, symbol))
         session_data = mofsl_sessions.get(name)
+        AsyncMofsl = mofsl_sessions.get_async(name)
 
-        if not meta or not session_data:
-            with thread_lock:
-                messages.append(f"❌ Missing data for {name} - {symbol} (no session/meta)")
+        if not meta or not session_data or not AsyncMofsl:
+            messages.append(f"❌ Missing data for {name} - {symbol} (no session/meta)")
             return
 
         Mofsl, userid = session_data
@@ -1017,24 +2420,15 @@ async def convert_position(payload: dict = Body(...)):
         }
 
         try:
-            resp = Mofsl.PositionConversion(PositionConversionInfo)
+            resp = await AsyncMofsl.PositionConversion(PositionConversionInfo)
             if resp and resp.get("status") == "SUCCESS":
-                with thread_lock:
-                    messages.append(f"✅ Converted {name} · {symbol} · {oldproduct}→{newproduct} · qty {quantity}")
+                messages.append(f"✅ Converted {name} · {symbol} · {oldproduct}→{newproduct} · qty {quantity}")
             else:
-                with thread_lock:
-                    messages.append(f"❌ Failed {name} · {symbol}: {resp.get('message', 'Unknown error') if isinstance(resp, dict) else resp}")
+                messages.append(f"❌ Failed {name} · {symbol}: {resp.get('message', 'Unknown error') if isinstance(resp, dict) else resp}")
         except Exception as e:
-            with thread_lock:
-                messages.append(f"❌ Error {name} · {symbol}: {str(e)}")
-
-    for pos in items:
-        t = threading.Thread(target=convert_single, args=(pos,))
-        t.start()
-        threads.append(t)
+            messages.append(f"❌ Error {name} · {symbol}: {str(e)}")
 
-    for t in threads:
-        t.join()
+    await asyncio.gather(*(convert_single(pos) for pos in items))
 
     return {"message": messages}
 
@@ -1055,64 +2449,72 @@ def get_available_margin(Mofsl, clientcode):
 def get_holdings():
     holdings_data = []
     summary_data = {}
+    sessions = mofsl_sessions.items()
 
-    for name, (Mofsl, userid) in mofsl_sessions.items():
+    def fetch_client(item):
+        name, (Mofsl, userid) = item
         try:
             response = Mofsl.GetDPHolding(userid)
             if response.get("status") != "SUCCESS":
-                continue
-
-            holdings = response.get("data", [])
-            invested = 0.0
-            total_pnl = 0.0
-
-            for holding in holdings:
-                symbol = holding.get("scripname", "").strip()
+                return None
+            held = []
+            for holding in response.get("data", []):
                 quantity = float(holding.get("dpquantity", 0))
-                buy_avg = float(holding.get("buyavgprice", 0))
                 scripcode = holding.get("nsesymboltoken")
                 if not scripcode or quantity <= 0:
                     continue
+                held.append((holding.get("scripname", "").strip(), quantity,
+                             float(holding.get("buyavgprice", 0)), int(scripcode)))
+            return held, get_available_margin(Mofsl, userid)
+        except Exception as e:
+            print(f"❌ Error fetching holdings for {name}: {e}")
+            return None
 
-                ltp_request = {"clientcode": userid, "exchange": "NSE", "scripcode": int(scripcode)}
-                ltp_response = Mofsl.GetLtp(ltp_request)
-                ltp = float(ltp_response.get("data", {}).get("ltp", 0)) / 100
-
-                pnl = round((ltp - buy_avg) * quantity, 2)
-                invested += quantity * buy_avg
-                total_pnl += pnl
+    # Every client's holdings at once, then one LTP per distinct scrip across all of them
+    fetched = list(holdings_fetch_executor.map(fetch_client, sessions))
+    wanted = [("NSE", scripcode) for result in fetched if result for _, _, _, scripcode in result[0]]
+    prices = ltp_resolver.resolve(wanted, [session for _, session in sessions]) if wanted else {}
 
-                holdings_data.append({
-                    "name": name,
-                    "symbol": symbol,
-                    "quantity": quantity,
-                    "buy_avg": round(buy_avg, 2),
-                    "ltp": round(ltp, 2),
-                    "pnl": pnl
-                })
-
-            capital = client_capital_map.get(name, 0)
-            try:
-                capital = float(capital)
-            except Exception:
-                capital = 0.0
+    for (name, _), result in zip(sessions, fetched):
+        if result is None:
+            continue
+        held, available_margin = result
+        invested = 0.0
+        total_pnl = 0.0
 
-            current_value = invested + total_pnl
-            available_margin = get_available_margin(Mofsl, userid)
-            net_gain = round((current_value + available_margin) - capital, 2)
+        for symbol, quantity, buy_avg, scripcode in held:
+            ltp = prices[("NSE", scripcode)]
+            pnl = round((ltp - buy_avg) * quantity, 2)
+            invested += quantity * buy_avg
+            total_pnl += pnl
 
-            summary_data[name] = {
+            holdings_data.append({
                 "name": name,
-                "capital": round(capital, 2),
-                "invested": round(invested, 2),
-                "pnl": round(total_pnl, 2),
-                "current_value": round(current_value, 2),
-                "available_margin": round(available_margin, 2),
-                "net_gain": net_gain
-            }
+                "symbol": symbol,
+                "quantity": quantity,
+                "buy_avg": round(buy_avg, 2),
+                "ltp": round(ltp, 2),
+                "pnl": pnl
+            })
 
-        except Exception as e:
-            print(f"❌ Error fetching holdings for {name}: {e}")
+        capital = client_capital_map.get(name, 0)
+        try:
+            capital = float(capital)
+        except Exception:
+            capital = 0.0
+
+        current_value = invested + total_pnl
+        net_gain = round((current_value + available_margin) - capital, 2)
+
+        summary_data[name] = {
+            "name": name,
+            "capital": round(capital, 2),
+            "invested": round(invested, 2),
+            "pnl": round(total_pnl, 2),
+            "current_value": round(current_value, 2),
+            "available_margin": round(available_margin, 2),
+            "net_gain": net_gain
+        }
 
     global summary_data_global
     summary_data_global = summary_data
@@ -1124,8 +2526,20 @@ def get_summary():
     global summary_data_global
     return {"summary": list(summary_data_global.values())}
 
+@app.get("/copy_engine_metrics")
+def copy_engine_metrics():
+    return {"mode": COPY_ENGINE_MODE, "pool": copy_worker_pool.metrics()}
+
+@app.get("/market_data_metrics")
+def market_data_metrics():
+    return {"feed": market_feed.metrics(), "cache": market_data_cache.metrics(), "rest_ltp": ltp_resolver.metrics()}
+
+@app.get("/symbol_search_metrics")
+def symbol_search_metrics():
+    return {"backend": SYMBOL_SEARCH_BACKEND, "cache": symbol_search_cache.metrics()}
+
 @app.post("/delete_client")
-async def delete_client(payload: dict = Body(...)):
+def delete_client(payload: dict = Body(...)):
     clients = payload.get("clients", [])
     results = []
 
@@ -1138,27 +2552,22 @@ async def delete_client(payload: dict = Body(...)):
             continue
 
         prefix = f"{name.replace(' ', '_')}_{client_id}"
-        deleted = False
-
-        for fname in os.listdir(CLIENTS_FOLDER):
-            if fname.startswith(prefix) and fname.endswith(".json"):
-                path = os.path.join(CLIENTS_FOLDER, fname)
-                try:
-                    os.remove(path)
-                    github_delete_file(f"clients/{fname}")
-                    results.append(f"✅ Deleted client: {name} ({client_id})")
-                    deleted = True
-                except Exception as e:
-                    results.append(f"❌ Error deleting {name}: {e}")
-                break
 
-        if not deleted:
-            results.append(f"⚠️ Not found: {name} ({client_id})")
+        try:
+            fname = client_repository.delete_by_prefix(prefix)
+            if fname:
+                github_delete_file(f"clients/{fname}")
+                mofsl_sessions.remove(name)
+                results.append(f"✅ Deleted client: {name} ({client_id})")
+            else:
+                results.append(f"⚠️ Not found: {name} ({client_id})")
+        except Exception as e:
+            results.append(f"❌ Error deleting {name}: {e}")
 
     return {"message": "\n".join(results)}
 
 @app.post("/create_group")
-async def create_group(payload: dict = Body(...)):
+def create_group(payload: dict = Body(...)):
     group_name = (payload.get("group_name") or "").strip()
     clients = payload.get("clients", [])
     multiplier = payload.get("multiplier", 1)
@@ -1193,16 +2602,7 @@ async def create_group(payload: dict = Body(...)):
 @app.get("/get_groups")
 def get_groups():
     groups = []
-    client_id_to_name = {}
-
-    for fname in os.listdir(CLIENTS_FOLDER):
-        if fname.endswith(".json"):
-            try:
-                with open(os.path.join(CLIENTS_FOLDER, fname), "r") as f:
-                    c = json.load(f)
-                    client_id_to_name[c.get("userid")] = c.get("name")
-            except Exception:
-                continue
+    client_id_to_name = client_repository.names_by_userid()
 
     if os.path.exists(GROUPS_FOLDER):
         for fname in os.listdir(GROUPS_FOLDER):
@@ -1226,7 +2626,7 @@ def get_groups():
     return {"groups": groups}
 
 @app.post("/delete_group")
-async def delete_group(payload: dict = Body(...)):
+def delete_group(payload: dict = Body(...)):
     groups = payload.get("groups", [])
     results = []
 
@@ -1247,7 +2647,7 @@ async def delete_group(payload: dict = Body(...)):
 
     return {"message": "\n".join(results)}
 @app.post("/save_copytrading_setup")
-async def save_copytrading_setup(payload: dict = Body(...)):
+def save_copytrading_setup(payload: dict = Body(...)):
     name = (payload.get("name") or "").strip()
     master = payload.get("master")
     children = payload.get("children", [])
@@ -1272,6 +2672,7 @@ async def save_copytrading_setup(payload: dict = Body(...)):
     try:
         with open(filepath, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4)
+        copy_setup_registry.put(filename[:-5], data)
 
         github_write_file(
             f"copytrading_setups/{filename}",
@@ -1286,31 +2687,19 @@ async def save_copytrading_setup(payload: dict = Body(...)):
 def list_copytrading_setups():
     setups = []
 
-    if not os.path.exists(COPYTRADING_FOLDER):
-        return {"setups": []}
-
-    for fname in os.listdir(COPYTRADING_FOLDER):
-        if not fname.endswith(".json"):
-            continue
-
-        try:
-            with open(os.path.join(COPYTRADING_FOLDER, fname), "r") as f:
-                s = json.load(f)
-
-            setups.append({
-                "setup_id": fname[:-5],
-                "name": s.get("name", ""),
-                "master": s.get("master", ""),
-                "children": s.get("children", []),
-                "enabled": s.get("enabled", False)
-            })
-        except Exception:
-            continue
+    for setup_id, s in copy_setup_registry.items():
+        setups.append({
+            "setup_id": setup_id,
+            "name": s.get("name", ""),
+            "master": s.get("master", ""),
+            "children": s.get("children", []),
+            "enabled": s.get("enabled", False)
+        })
 
     return {"setups": setups}
 
 @app.post("/delete_copy_setup")
-async def delete_copy_setup(payload: dict = Body(...)):
+def delete_copy_setup(payload: dict = Body(...)):
     setup_id = payload.get("setup_id")
     if not setup_id:
         raise HTTPException(status_code=400, detail="setup_id required")
@@ -1323,13 +2712,14 @@ async def delete_copy_setup(payload: dict = Body(...)):
 
     try:
         os.remove(filepath)
+        copy_setup_registry.remove(setup_id)
         github_delete_file(f"copytrading_setups/{filename}")
         return {"success": True, "message": "Setup deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/enable_copy_setup")
-async def enable_copy_setup(setup_id: str = Form(...)):
+def enable_copy_setup(setup_id: str = Form(...)):
     filename = f"{setup_id}.json"
     file_path = os.path.join(COPYTRADING_FOLDER, filename)
 
@@ -1344,6 +2734,7 @@ async def enable_copy_setup(setup_id: str = Form(...)):
 
         with open(file_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4)
+        copy_setup_registry.put(setup_id, data)
 
         # 🔁 mirror to GitHub
         github_write_file(
@@ -1357,7 +2748,7 @@ async def enable_copy_setup(setup_id: str = Form(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/disable_copy_setup")
-async def disable_copy_setup(setup_id: str = Form(...)):
+def disable_copy_setup(setup_id: str = Form(...)):
     filename = f"{setup_id}.json"
     file_path = os.path.join(COPYTRADING_FOLDER, filename)
 
@@ -1372,6 +2763,7 @@ async def disable_copy_setup(setup_id: str = Form(...)):
 
         with open(file_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=4)
+        copy_setup_registry.put(setup_id, data)
 
         # 🔁 mirror to GitHub
         github_write_file(
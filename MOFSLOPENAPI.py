@@ -1,5 +1,7 @@
 import requests
 from requests import get
+from requests.adapters import HTTPAdapter
+from http.cookiejar import DefaultCookiePolicy
 import json
 import os
 from datetime import datetime, timezone
@@ -24,8 +26,11 @@ from struct import *
 import time
 # from datetime import datetime 
 import datetime as dt
-from queue import Queue
-from threading import Thread
+import asyncio
+import httpx
+import numpy as np
+from functools import lru_cache
+from threading import Thread, Lock
 
 
 
@@ -126,6 +131,350 @@ def WriteIntoLog_TradeStatus(f_status, f_filename, f_message):
             
 
 
+# HTTP connection pool
+# One keep-alive requests.Session is shared by every MOFSLOPENAPI instance in the
+# process, so REST calls reuse open TCP/TLS connections instead of paying a new
+# handshake per request. Pool sizes come from the environment or from
+# ConfigureHttpPool().
+m_HttpPoolConnections = int(os.getenv("MOFSL_HTTP_POOL_CONNECTIONS", "4"))   # number of per-host pools kept
+m_HttpPoolMaxsize = int(os.getenv("MOFSL_HTTP_POOL_MAXSIZE", "64"))          # connections kept alive per host
+m_HttpPoolBlock = os.getenv("MOFSL_HTTP_POOL_BLOCK", "0") == "1"             # wait for a free connection instead of opening extra ones
+m_HttpTimeout = float(os.getenv("MOFSL_HTTP_TIMEOUT", "30"))               # seconds, used by the asyncio client
+m_HttpSession = None
+m_HttpSessionLock = Lock()
+m_AsyncHttpClient = None
+m_AsyncHttpClientLoop = None
+m_AsyncHttpClientLock = Lock()
+m_AsyncHttpClientClosing = set()   # aclose tasks of replaced clients, kept alive until they finish
+
+def ConfigureHttpPool(f_pool_connections = None, f_pool_maxsize = None, f_pool_block = None):
+    global m_HttpPoolConnections, m_HttpPoolMaxsize, m_HttpPoolBlock, m_HttpSession
+
+    with m_HttpSessionLock:
+        if f_pool_connections is not None:
+            m_HttpPoolConnections = int(f_pool_connections)
+        if f_pool_maxsize is not None:
+            m_HttpPoolMaxsize = int(f_pool_maxsize)
+        if f_pool_block is not None:
+            m_HttpPoolBlock = bool(f_pool_block)
+
+        # Next GetHttpSession() call builds a pool with the new limits
+        l_OldSession = m_HttpSession
+        m_HttpSession = None
+
+    if l_OldSession is not None:
+        l_OldSession.close()
+
+def GetHttpSession():
+    global m_HttpSession
+
+    l_Session = m_HttpSession
+    if l_Session is not None:
+        return l_Session
+
+    with m_HttpSessionLock:
+        if m_HttpSession is None:
+            l_Session = requests.Session()
+            # The session is shared by all client logins, never replay a cookie
+            # set for one client on another client's request.
+            l_Session.cookies.set_policy(DefaultCookiePolicy(allowed_domains = []))
+            l_Adapter = HTTPAdapter(pool_connections = m_HttpPoolConnections,
+                                    pool_maxsize = m_HttpPoolMaxsize,
+                                    pool_block = m_HttpPoolBlock)
+            l_Session.mount("https://", l_Adapter)
+            l_Session.mount("http://", l_Adapter)
+            m_HttpSession = l_Session
+            WriteIntoLog("SUCCESS", "MOFSLOPENAPI.py", "HTTP connection pool created (pool_connections=%d, pool_maxsize=%d)" % (m_HttpPoolConnections, m_HttpPoolMaxsize))
+        return m_HttpSession
+
+def GetAsyncHttpClient():
+    # One httpx.AsyncClient per event loop, shared by every AsyncMOFSLOPENAPI
+    global m_AsyncHttpClient, m_AsyncHttpClientLoop
+
+    l_Loop = asyncio.get_running_loop()
+    l_Client = m_AsyncHttpClient
+    if l_Client is not None and m_AsyncHttpClientLoop is l_Loop:
+        return l_Client
+
+    with m_AsyncHttpClientLock:
+        if m_AsyncHttpClient is not None and m_AsyncHttpClientLoop is l_Loop:
+            return m_AsyncHttpClient
+        l_OldClient, l_OldLoop = m_AsyncHttpClient, m_AsyncHttpClientLoop
+        l_Client = httpx.AsyncClient(
+            limits = httpx.Limits(max_connections = m_HttpPoolMaxsize, max_keepalive_connections = m_HttpPoolMaxsize),
+            timeout = httpx.Timeout(m_HttpTimeout))
+        l_Client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains = []))
+        m_AsyncHttpClient = l_Client
+        m_AsyncHttpClientLoop = l_Loop
+        WriteIntoLog("SUCCESS", "MOFSLOPENAPI.py", "Async HTTP client created (max_connections=%d)" % (m_HttpPoolMaxsize))
+
+    if l_OldClient is not None:
+        CloseReplacedAsyncHttpClient(l_OldClient, l_OldLoop, l_Loop)
+    return l_Client
+
+def CloseReplacedAsyncHttpClient(f_Client, f_OldLoop, f_Loop):
+    # Close the client of the previous loop on that loop while it still runs, else on this one
+    async def AClose():
+        try:
+            await f_Client.aclose()
+        except Exception as e:
+            WriteIntoLog("FAILED", "MOFSLOPENAPI.py", "Closing replaced async HTTP client: " + str(e))
+
+    if f_OldLoop is not None and f_OldLoop.is_running() and not f_OldLoop.is_closed():
+        asyncio.run_coroutine_threadsafe(AClose(), f_OldLoop)
+    else:
+        l_Task = f_Loop.create_task(AClose())
+        m_AsyncHttpClientClosing.add(l_Task)
+        l_Task.add_done_callback(m_AsyncHttpClientClosing.discard)
+
+async def CloseAsyncHttpClient():
+    global m_AsyncHttpClient, m_AsyncHttpClientLoop
+
+    with m_AsyncHttpClientLock:
+        l_Client = m_AsyncHttpClient
+        m_AsyncHttpClient = None
+        m_AsyncHttpClientLoop = None
+    if l_Client is not None:
+        await l_Client.aclose()
+
+
+# Broadcast feed decoding
+# Every feed frame is 30 little-endian bytes: a 10-byte header (exchange letter,
+# scrip code, seconds since 1980-01-01 local time, message type letter) and a
+# 20-byte body laid out by message type. A received buffer of whole frames is
+# viewed as NumPy structured arrays, one record layout per message type, so all
+# frames are decoded in one pass instead of slicing each frame in Python. The
+# batch has a fixed NumPy setup cost, so it only pays off for large buffers;
+# smaller ones go frame by frame through one precompiled Struct per layout,
+# dispatched on the message type byte. The websocket and TCP feeds share both.
+m_BroadcastFrameLength = 30
+m_BroadcastBatchMinFrames = int(os.getenv("MOFSL_BROADCAST_BATCH_MIN_FRAMES", "768"))   # smaller buffers keep the per-frame parser
+m_BroadcastEpoch = datetime(1980, 1, 1, 0, 0, 0).timestamp()
+m_BroadcastHeader = [("Exchange", "S1", 0), ("Scrip Code", "<i4", 1), ("Time", "<i4", 5), ("MsgType", "S1", 9)]
+
+# message type letter → (callback message type, body fields as (name, format, offset))
+m_BroadcastLayouts = {
+    b"A": ("LTP", [("LTP_Rate", "<f4", 10), ("LTP_Qty", "<i4", 14), ("LTP_Cumulative Qty", "<i4", 18),
+                   ("LTP_AvgTradePrice", "<f4", 22), ("LTP_Open Interest", "<i4", 26)]),
+    b"G": ("DayOHLC", [("Open", "<f4", 10), ("High", "<f4", 14), ("Low", "<f4", 18), ("PrevDayClose", "<f4", 22)]),
+    b"W": ("DPR", [("UpperCktLimit", "<f4", 10), ("LowerCktLimit", "<f4", 14)]),
+    b"H": ("Index", [("Rate", "<f4", 10)]),
+    b"m": ("OpenInterest", [("Open Interest", "<i4", 10), ("Open Interest High", "<i4", 14), ("Open Interest Low", "<i4", 18)]),
+    b"1": ("Heartbeat", []),
+}
+for l_msgtype in (b"B", b"C", b"D", b"E", b"F"):
+    m_BroadcastLayouts[l_msgtype] = ("MarketDepth", [("BidRate", "<f4", 10), ("BidQty", "<i4", 14), ("BidOrder", "<i2", 18),
+                                                     ("OfferRate", "<f4", 20), ("OfferQty", "<i4", 24), ("OfferOrder", "<i2", 28)])
+
+def BroadcastDtype(f_fields):
+    return np.dtype({"names": [f[0] for f in f_fields], "formats": [f[1] for f in f_fields],
+                     "offsets": [f[2] for f in f_fields], "itemsize": m_BroadcastFrameLength})
+
+m_BroadcastHeaderDtype = BroadcastDtype(m_BroadcastHeader)
+m_BroadcastDtypes = {k: BroadcastDtype(m_BroadcastHeader + v[1]) for k, v in m_BroadcastLayouts.items()}
+m_BroadcastScripTypes = frozenset([b"A", b"B", b"C", b"D", b"E", b"F", b"G", b"W", b"m", b"1"])   # answered for subscribed scrips
+m_BroadcastIndexTypes = frozenset([b"H", b"1"])                                                 # answered for subscribed index exchanges
+
+def BroadcastStruct(f_fields):
+    # Body fields in offset order, unused bytes skipped as padding
+    l_format, l_position = "<", 10
+    for l_name, l_type, l_offset in f_fields:
+        l_format += "x" * (l_offset - l_position) + {"<f4": "f", "<i4": "i", "<i2": "h"}[l_type]
+        l_position = l_offset + np.dtype(l_type).itemsize
+    return Struct(l_format + "x" * (m_BroadcastFrameLength - l_position))
+
+m_BroadcastHeaderStruct = Struct("<ciic")
+# message type letter → (callback message type, body Struct, body keys, positions of rate fields, depth level or None)
+m_BroadcastDecoders = {}
+for l_msgtype, (l_name, l_fields) in m_BroadcastLayouts.items():
+    m_BroadcastDecoders[l_msgtype] = (l_name, BroadcastStruct(l_fields), [f[0] for f in l_fields],
+                                      [i for i, f in enumerate(l_fields) if f[1] == "<f4"],
+                                      l_msgtype[0] - ord("A") if l_name == "MarketDepth" else None)
+
+# exchange letter → exchange name; "N" frames above the cash scrip range are NSEFO
+m_BroadcastExchangeNames = {b"N": "NSE", b"B": "BSE", b"M": "MCX", b"D": "NCDEX", b"C": "NSECD", b"G": "BSEFO"}
+m_BroadcastExchanges = np.full(256, None, dtype=object)
+for l_letter, l_name in m_BroadcastExchangeNames.items():
+    m_BroadcastExchanges[l_letter[0]] = l_name
+
+# exchange name → letter used in subscription packets and the feed header, otherwise its first letter
+m_BroadcastExchangeLetters = {"NSECD": "C", "NCDEX": "D", "BSEFO": "G"}
+
+def BroadcastExchangeLetter(f_exchange):
+    l_exchange = f_exchange.upper()
+    return m_BroadcastExchangeLetters.get(l_exchange, l_exchange[0])
+
+def BroadcastExchangeName(f_exchange, f_scrip):
+    l_name = m_BroadcastExchangeNames.get(f_exchange)
+    if l_name == "NSE" and f_scrip > 34999 and not (888801 <= f_scrip <= 888820):
+        return "NSEFO"
+    return l_name
+
+@lru_cache(maxsize = 4096)
+def BroadcastTime(f_epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(f_epoch + m_BroadcastEpoch))
+
+def DecodeBroadcastBody(f_exchange, f_scrip, f_time, f_msgtype, f_message, f_bodyoffset = 0):
+    """(callback message type, data) for a decoded frame header and the 20-byte body at f_bodyoffset."""
+    l_name, l_struct, l_keys, l_rates, l_level = m_BroadcastDecoders[f_msgtype]
+    l_data = {}
+    l_exchange = BroadcastExchangeName(f_exchange, f_scrip)
+    if l_exchange is not None:
+        l_data["Exchange"] = l_exchange
+    l_data["Scrip Code"] = f_scrip
+    l_data["Time"] = f_time
+    l_values = l_struct.unpack_from(f_message, f_bodyoffset)
+    if l_rates:
+        l_values = list(l_values)
+        for i in l_rates:
+            l_values[i] = round(l_values[i], 2)
+    l_data.update(zip(l_keys, l_values))
+    if l_level is not None:
+        l_data["Level"] = l_level
+    return l_name, l_data
+
+def DecodeBroadcastFrames(f_message, f_scripcodes = None, f_exchangeindexes = None):
+    """Frame-by-frame twin of DecodeBroadcastMessages, cheaper for small buffers."""
+    l_scripstage, l_indexstage = [], []
+    l_unpack = m_BroadcastHeaderStruct.unpack_from
+    for l_offset in range(0, len(f_message) - m_BroadcastFrameLength + 1, m_BroadcastFrameLength):
+        l_exchange, l_scrip, l_epoch, l_msgtype = l_unpack(f_message, l_offset)
+        if f_scripcodes is None:
+            l_inscrip = l_msgtype == b"1"
+        else:
+            l_inscrip = l_msgtype in m_BroadcastScripTypes and (l_exchange, l_scrip) in f_scripcodes
+        if f_exchangeindexes is None:
+            l_inindex = l_msgtype == b"1"
+        else:
+            l_inindex = l_msgtype in m_BroadcastIndexTypes and l_exchange in f_exchangeindexes
+        if l_inscrip or l_inindex:
+            l_decoded = DecodeBroadcastBody(l_exchange, l_scrip, BroadcastTime(l_epoch), l_msgtype, f_message, l_offset + 10)
+            if l_inscrip:
+                l_scripstage.append(l_decoded)
+            if l_inindex:
+                l_indexstage.append(l_decoded)
+    return l_scripstage + l_indexstage
+
+class BroadcastFrameBuffer(object):
+    # Reassembles the feed into whole frames. A preallocated bytearray is filled
+    # by socket.recv_into (or by appending websocket messages); every read hands
+    # out the complete frames and carries the trailing partial frame over to the
+    # next read, so nothing is dropped when the stream splits a frame.
+
+    def __init__(self, f_capacity = 102400, f_framelength = m_BroadcastFrameLength):
+        self.m_framelength = f_framelength
+        self.m_buffer = bytearray(max(f_capacity, f_framelength))
+        self.m_view = memoryview(self.m_buffer)
+        self.m_length = 0           # bytes held, a partial frame between reads
+
+    def RecvInto(self, f_socket):
+        """Read from the socket into the free space, returns the byte count (0 on close)."""
+        l_received = f_socket.recv_into(self.m_view[self.m_length:])
+        self.m_length += l_received
+        return l_received
+
+    def Feed(self, f_data):
+        """Append received bytes, growing the buffer if a message exceeds the free space."""
+        l_end = self.m_length + len(f_data)
+        if l_end > len(self.m_buffer):
+            self.m_view.release()
+            self.m_buffer.extend(bytes(l_end - len(self.m_buffer)))
+            self.m_view = memoryview(self.m_buffer)
+        self.m_view[self.m_length:l_end] = f_data
+        self.m_length = l_end
+
+    def Frames(self):
+        """The complete frames held, as bytes (b"" if none); the partial remainder stays buffered."""
+        l_whole = self.m_length - self.m_length % self.m_framelength
+        if l_whole == 0:
+            return b""
+        l_frames = bytes(self.m_view[:l_whole])
+        self.m_view[:self.m_length - l_whole] = self.m_view[l_whole:self.m_length]
+        self.m_length -= l_whole
+        return l_frames
+
+def DecodeBroadcastBatch(f_message):
+    """Decode a buffer of whole frames in one pass: {message type letter: (frame positions, typed records)}."""
+    l_frames = np.frombuffer(f_message, dtype=m_BroadcastHeaderDtype)
+    l_msgtypes = l_frames["MsgType"]
+    l_batch = {}
+    for l_msgtype in np.unique(l_msgtypes).tolist():
+        l_positions = np.flatnonzero(l_msgtypes == l_msgtype)
+        l_dtype = m_BroadcastDtypes.get(l_msgtype, m_BroadcastHeaderDtype)
+        l_batch[l_msgtype] = (l_positions, np.frombuffer(f_message, dtype=l_dtype)[l_positions])
+    return l_frames, l_batch
+
+def BroadcastTimes(f_epochs):
+    # Format each distinct second once; a batch rarely spans more than a few
+    l_unique, l_inverse = np.unique(f_epochs, return_inverse=True)
+    l_text = [BroadcastTime(l_epoch) for l_epoch in l_unique.tolist()]
+    return [l_text[i] for i in l_inverse.tolist()]
+
+def BroadcastRows(f_records):
+    # Callback dicts for one message type's records, keyed like the per-message parsers
+    l_scrips = f_records["Scrip Code"]
+    l_exchanges = m_BroadcastExchanges[f_records["Exchange"].view(np.uint8)]
+    l_exchanges[(l_exchanges == "NSE") & (l_scrips > 34999) & ((l_scrips < 888801) | (l_scrips > 888820))] = "NSEFO"
+    l_keys, l_columns = ["Exchange", "Scrip Code", "Time"], [l_exchanges.tolist(), l_scrips.tolist(), BroadcastTimes(f_records["Time"])]
+    l_msgtype = f_records["MsgType"][0]
+    for l_name, l_format, l_offset in m_BroadcastLayouts[l_msgtype][1]:
+        l_column = f_records[l_name]
+        if l_format == "<f4":
+            with np.errstate(invalid="ignore", over="ignore"):
+                l_column = np.round(l_column.astype(np.float64), 2)
+        l_keys.append(l_name)
+        l_columns.append(l_column.tolist())
+    l_level = m_BroadcastDecoders[l_msgtype][4]
+    if l_level is not None:
+        l_keys.append("Level")
+        l_columns.append([l_level] * len(f_records))
+    l_rows = [dict(zip(l_keys, l_values)) for l_values in zip(*l_columns)]
+    if None in l_columns[0]:
+        for l_row in l_rows:
+            if l_row["Exchange"] is None:
+                del l_row["Exchange"]
+    return l_rows
+
+def BroadcastKeys(f_exchanges, f_scrips):
+    # (exchange letter, scrip) packed into one int64 per frame for vectorised subscription lookups
+    return (f_exchanges.view(np.uint8).astype(np.int64) << 32) | (f_scrips.astype(np.int64) & 0xFFFFFFFF)
+
+def DecodeBroadcastMessages(f_message, f_scripcodes = None, f_exchangeindexes = None):
+    """(callback message type, data) pairs for a buffer of whole frames, in Packet_Parsing order.
+
+    f_scripcodes is a set of (exchange letter, scrip) pairs and f_exchangeindexes a set of
+    exchange letters, both as bytes; callers pass a snapshot nobody mutates while it is read. Frames of the subscribed scrips come first, then index
+    frames of the subscribed exchanges. Without a scrip (or index) subscription only
+    heartbeats pass that stage.
+    """
+    l_frames, l_batch = DecodeBroadcastBatch(f_message)
+    l_msgtypes = l_frames["MsgType"]
+    l_heartbeats = l_msgtypes == b"1"
+    if f_scripcodes is None:
+        l_scripstage = l_heartbeats
+    else:
+        l_subscribed = np.array([(e[0] << 32) | (c & 0xFFFFFFFF) for e, c in f_scripcodes], dtype=np.int64)
+        l_scripstage = (np.isin(BroadcastKeys(l_frames["Exchange"], l_frames["Scrip Code"]), l_subscribed)
+                        & np.isin(l_msgtypes, list(m_BroadcastScripTypes)))
+    if f_exchangeindexes is None:
+        l_indexstage = l_heartbeats
+    else:
+        l_indexstage = (np.isin(l_frames["Exchange"], list(f_exchangeindexes))
+                        & np.isin(l_msgtypes, list(m_BroadcastIndexTypes)))
+
+    l_needed = l_scripstage | l_indexstage
+    l_decoded = [None] * len(l_frames)
+    for l_msgtype, (l_positions, l_records) in l_batch.items():
+        l_keep = l_needed[l_positions]
+        if not l_keep.any():
+            continue
+        l_name = m_BroadcastLayouts[l_msgtype][0]
+        for l_position, l_row in zip(l_positions[l_keep].tolist(), BroadcastRows(l_records[l_keep])):
+            l_decoded[l_position] = (l_name, l_row)
+    return ([l_decoded[i] for i in np.flatnonzero(l_scripstage).tolist()]
+            + [l_decoded[i] for i in np.flatnonzero(l_indexstage).tolist()])
+
+
 # UserInfo
 def GetMacAddress(): 
     try:
@@ -297,14 +646,18 @@ class MOFSLOPENAPI(object):
     m_TCPscriptask = ""
     m_indextask = ""
     m_TCPindextask = ""
-    l_scrip_code = []
-    l_TCPscrip_code = []
-
-    l_exchange_index = []
-    l_TCPexchange_index = []
+    # Subscriptions: (exchange letter, scrip) pairs and index exchange letters, as bytes like the
+    # feed frame header. Copy-on-write frozensets: writers swap in a new set under
+    # m_SubscriptionLock, so the feed thread decodes against a snapshot that never changes
+    l_scrip_code = frozenset()
+    l_TCPscrip_code = frozenset()
+
+    l_exchange_index = frozenset()
+    l_TCPexchange_index = frozenset()
     m_clientcode = ""
     Websocket_version = "VER 2.0"
-    q_msg = Queue()
+    m_FrameBuffer = None            # BroadcastFrameBuffer of the websocket feed, created on first message
+    m_TCPFrameBuffer = None         # BroadcastFrameBuffer of the TCP feed, created on connect
 
     ws1 = None
     ws2 = None
@@ -316,6 +669,8 @@ class MOFSLOPENAPI(object):
     m_responsepacketlength = 30
     m_TCPresponsepacketlength = 30
     TradeStatusHeartbeat_flag = True
+    TradeStatusAutoReconnect_flag = True
+    m_TradeStatusHeartbeat = None
     BroadcastAutoRelogin_flag = True
     TCPBroadcastAutoRelogin_flag = True
     Broadcast_Logout_flag = True
@@ -349,8 +704,11 @@ class MOFSLOPENAPI(object):
         self.m_latitudelongitude = GetLatitudeLongitude()
 
         # self.Websocket_URL = self.Websocket_URL
-        # self.l_scrip_code = []
-        # self.l_exchange_index = []
+        self.l_scrip_code = frozenset()
+        self.l_TCPscrip_code = frozenset()
+        self.l_exchange_index = frozenset()
+        self.l_TCPexchange_index = frozenset()
+        self.m_SubscriptionLock = Lock()
         self.Websocket_version = self.Websocket_version
 
         WriteIntoLog("SUCCESS", "MOFSLOPENAPI.py", "Initilize Constructor Done")
@@ -475,49 +833,55 @@ class MOFSLOPENAPI(object):
  
 
 
+    def GetHeaders(self):
+
+        m_headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization" : self.m_strMOFSLToken,
+            "User-Agent" : self.m_strUseragent,
+            "apikey": self.m_strApikey, 
+            "apisecretkey" : self.m_strApiSecretkey,
+            "macaddress": self.m_strMACAddress,
+            "clientlocalip": self.m_strClientLocalIP,
+            "sourceid": self.m_strSourceID,
+            "clientpublicip": self.m_strClientPublicIP,
+            "vendorinfo": self.m_vendorinfo,
+
+            "osname": self.m_osname, 
+            "osversion" : self.m_osversion,
+            "installedappid": self.m_installedappid,
+            "devicemodel": self.m_devicemodel,
+            "manufacturer": self.m_manufacturer,
+            "productname": self.m_productname,
+            "productversion": self.m_productversion,
+
+            "latitude": str("%.4f" % self.m_latitudelongitude[0]),
+            "longitude": str("%.4f" % self.m_latitudelongitude[1]),
+            "sdkversion":"Python 3.0"
+
+            # "browsername": self.m_browsername,
+            # "browserversion": self.m_browserversion,
+            # "imeino": self.m_imeino
+
+        }
+
+        if self.m_strSourceID.upper() == "WEB":
+            m_headers["browsername"] = self.m_browsername
+            m_headers["browserversion"] = self.m_browserversion
+
+        return m_headers
+
     def validate(self, f_URL, f_Data):
 
         WriteIntoLog("SUCCESS", "MOFSLOPENAPI.py", "Initilize Post WebRequest Sent")
 
         try:
 
-            m_headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "Authorization" : self.m_strMOFSLToken,
-                "User-Agent" : self.m_strUseragent,
-                "apikey": self.m_strApikey, 
-                "apisecretkey" : self.m_strApiSecretkey,
-                "macaddress": self.m_strMACAddress,
-                "clientlocalip": self.m_strClientLocalIP,
-                "sourceid": self.m_strSourceID,
-                "clientpublicip": self.m_strClientPublicIP,
-                "vendorinfo": self.m_vendorinfo,
-
-                "osname": self.m_osname, 
-                "osversion" : self.m_osversion,
-                "installedappid": self.m_installedappid,
-                "devicemodel": self.m_devicemodel,
-                "manufacturer": self.m_manufacturer,
-                "productname": self.m_productname,
-                "productversion": self.m_productversion,
-
-                "latitude": str("%.4f" % self.m_latitudelongitude[0]),
-                "longitude": str("%.4f" % self.m_latitudelongitude[1]),
-                "sdkversion":"Python 3.0"
-
-                # "browsername": self.m_browsername,
-                # "browserversion": self.m_browserversion,
-                # "imeino": self.m_imeino
-
-            }
-
-            if self.m_strSourceID.upper() == "WEB":
-                m_headers["browsername"] = self.m_browsername
-                m_headers["browserversion"] = self.m_browserversion
+            m_headers = self.GetHeaders()
 
             # print(m_headers)            
-            response = requests.post(f_URL, headers= m_headers, data = json.dumps(f_Data))
+            response = GetHttpSession().post(f_URL, headers= m_headers, data = json.dumps(f_Data))
             # print("JSON Response ", response.content)
             j_ResponseMessage = response.content.decode('utf-8')
 
@@ -1516,18 +1880,8 @@ class MOFSLOPENAPI(object):
 
         if (len(self.l_scrip_code) < MaxBroadcastLimit):
 
-            if f_scriptcode not in self.l_scrip_code:
-                self.l_scrip_code.append(f_scriptcode)
-
-            l_exchange = f_exchange.upper()
-            if (l_exchange== "NSECD"):
-                l_exchangeindex = "C"
-            elif (l_exchange == "NCDEX"):
-                l_exchangeindex = "D"
-            elif (l_exchange == "BSEFO"):
-                l_exchangeindex = "G"
-            else :
-                l_exchangeindex = l_exchange[0]
+            l_exchangeindex = BroadcastExchangeLetter(f_exchange)
+            self.UpdateSubscription("l_scrip_code", (l_exchangeindex.encode(), f_scriptcode), True)
 
             l_exchangetype = f_exchangetype.upper()
             l_exchangetypeindex = l_exchangetype[0]
@@ -1553,19 +1907,17 @@ class MOFSLOPENAPI(object):
             Log_Message = ("Script %d Register Failed, Scrip count is greater than max limit"%(f_scriptcode))
             WriteIntoLog_Broadcast("Info", "MOFSLOPENAPI.py", Log_Message)
 
+    def UpdateSubscription(self, f_name, f_key, f_add):
+        # Never mutate the published set in place: the feed thread may be iterating it
+        with self.m_SubscriptionLock:
+            l_current = getattr(self, f_name)
+            setattr(self, f_name, l_current | {f_key} if f_add else l_current - {f_key})
+
     def UnRegister(self, f_exchange, f_exchangetype, f_scriptcode):
         self.m_scriptask = "D"
-        self.l_scrip_code.remove(f_scriptcode)
-
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-                l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
+        self.UpdateSubscription("l_scrip_code", (l_exchangeindex.encode(), f_scriptcode), False)
 
         l_exchangetype = f_exchangetype.upper()
         l_exchangetypeindex = l_exchangetype[0]
@@ -1591,17 +1943,9 @@ class MOFSLOPENAPI(object):
         
         # l_exchange = f_exchange.upper()
         # l_exchangeindex = l_exchange[0]
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-            l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
 
-        self.l_exchange_index.append(l_exchangeindex)
+        self.UpdateSubscription("l_exchange_index", l_exchangeindex.encode(), True)
         
         if self.m_strMOFSLToken:
             self.Login_on_open()
@@ -1616,17 +1960,9 @@ class MOFSLOPENAPI(object):
 
         # l_exchange = f_exchange.upper()
         # l_exchangeindex = l_exchange[0]
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-            l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
 
-        self.l_exchange_index.remove(l_exchangeindex)
+        self.UpdateSubscription("l_exchange_index", l_exchangeindex.encode(), False)
         # print("IndexUnregister Packet sent")
         if self.m_strMOFSLToken:
             Log_Message = ("Index %s UnRegister Packet Sent"%(f_exchange))
@@ -1640,350 +1976,57 @@ class MOFSLOPENAPI(object):
     def Packet_Condition(self, message):
         # time.sleep(1)
         msg = message
-        if len(msg) % self.m_responsepacketlength == 0:
+        if self.m_FrameBuffer is None:
+            self.m_FrameBuffer = BroadcastFrameBuffer(f_framelength = self.m_responsepacketlength)
+
+        if self.m_FrameBuffer.m_length == 0 and len(msg) % self.m_responsepacketlength == 0:
             self.Packet_Parsing(message)
 
         else:
-            # q_msg = Queue()
-            for i in msg:
-                self.q_msg.put(i)
-                if len(self.q_msg) == 30:
-                        self.Packet_Parsing(self.q_msg)
-                        self.q_msg.get(self.q_msg[0:30]) 
+            # A frame split across messages, keep the tail until the rest arrives
+            self.m_FrameBuffer.Feed(msg)
+            l_frames = self.m_FrameBuffer.Frames()
+            if l_frames:
+                self.Packet_Parsing(l_frames)
 
 
     def Packet_Parsing(self, message):
-        # time.sleep(1)
         msg = message
-        # self._Broadcast_on_message(self.ws1,message_type,msg)
-        # print(msg)
-        # print(len(msg), type(msg))
 
         if len(msg) % self.m_responsepacketlength == 0:
-        
-            l_Response30bytes=[]
-            l_headerdecodedlist=[]
-            l_msglist=[]
-            for i in range(0, len(msg), self.m_responsepacketlength):
-                l_Response30bytes.append(msg[i:i+ self.m_responsepacketlength])
-                l_30bytessplitlist = l_Response30bytes
-            
-
-            for i in l_30bytessplitlist:
-                b_exchange, b_scrip, b_time, b_msgtype = i[:1], i[1:5], i[5:9], i[9:10]
-                b_20bytesbody = i[10:30]
-
-                exchange = b_exchange.decode()
-                scrip = int.from_bytes(b_scrip, byteorder= "little", signed=True)
-                epoch1 = int.from_bytes(b_time, byteorder= "little", signed=True)
-                epoch2 = datetime(1980, 1, 1, 0, 0, 0).timestamp()
-                t = epoch1 + epoch2
-                my_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
-
-                msgtype = b_msgtype.decode()
-                
-                l_headerdecodedlist.append(exchange)
-                l_headerdecodedlist.append(scrip)
-                l_headerdecodedlist.append(my_time)
-                l_headerdecodedlist.append(msgtype)
-
-                l_headerdecodedlist.append(b_20bytesbody)
-            # print(l_headerdecodedlist)
-            # print(len(l_headerdecodedlist), type(l_headerdecodedlist))
-                    
-            l_msglist = [l_headerdecodedlist[i:i+5] for i in range(0, len(l_headerdecodedlist), 5)]
-            # print(l_msglist)
-            # print(len(l_msglist), type(l_msglist)) 
-
-
-
-            if self.m_scriptask == "D":
-                for i in l_msglist:
-
-                    l_msg = i
-                    msg_type = i[3]
-                    l_scripcode = i[1]
-                    if (l_scripcode in self.l_scrip_code):
-                        if msg_type == "A":
-                            self.LTP(l_msg)
-                        elif (msg_type =="B" or msg_type =="C" or msg_type =="D"or msg_type =="E" or msg_type =="F"):
-                            self.MarketDepth(l_msg)
-                        elif msg_type == "G":
-                            self.DayOHLC(l_msg)
-                        elif msg_type == "W":
-                            self.DPR(l_msg)
-                        elif msg_type == "m":
-                            self.OpenInterest(l_msg)
-                        elif  msg_type == "1":
-                            # Log_Message = ("Heartbeat request %s received"%(l_msg))
-                            # WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                            self.Heartbeat(l_msg)
-                        else:
-                            # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                            pass
-            else:
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    
-                    if msg_type == "1":
-                        # Log_Message_1 = ("Heartbeat request %s received"%(l_msg))
-                        # WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                        self.Heartbeat(l_msg)
-                    else:
-                        # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                        pass      
-            
-            if self.m_indextask == "H":
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    l_exchange = i[0]
-                    if (l_exchange in self.l_exchange_index):
-                        if msg_type == "H":
-                            self.Index(l_msg)
-                        elif  msg_type == "1":
-                            # Log_Message_2 = ("Heartbeat request %s received"%(l_msg))
-                            WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                            self.Heartbeat(l_msg)
-                        # elif msg_type == "G":
-                        #     self.DayOHLC(l_msg)
-                        else:
-                            # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                            pass
+            l_scripcodes = self.l_scrip_code if self.m_scriptask == "D" else None
+            l_exchangeindexes = self.l_exchange_index if self.m_indextask == "H" else None
+            if len(msg) >= m_BroadcastBatchMinFrames * self.m_responsepacketlength:
+                l_messages = DecodeBroadcastMessages(msg, l_scripcodes, l_exchangeindexes)
             else:
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    
-                    if msg_type == "1":
-                        WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                        self.Heartbeat(l_msg)
-                    else:
-                        # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                        pass                        
+                l_messages = DecodeBroadcastFrames(msg, l_scripcodes, l_exchangeindexes)
+
+            for l_message_type, l_data in l_messages:
+                if l_message_type == "Heartbeat":
+                    WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
+                    self.Heartbeat(l_data)
+                else:
+                    self._Broadcast_on_message(self.ws1,l_message_type,l_data)
         else:
             l_message_type = "NotSpecified"
             self._Broadcast_on_message(self.ws1,l_message_type,msg)
-            # print(msg)
-            # print(len(msg), type(msg))
-
-
-    def LTP(self, f_msg):
-        l_LTPResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-        b_Rate, b_Qty, b_Cumulative_Qty, b_AvgTradePrice, b_Open_Interest = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:16], l_msg[4][16:]
-
-        flt_1 = unpack("f", b_Rate)
-        l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Rate = round(l_Rateflt, 2)
 
-        l_Qty = int.from_bytes(b_Qty, byteorder= "little", signed=True)
-        l_Cumulative_Qty = int.from_bytes(b_Cumulative_Qty, byteorder= "little", signed=True)
 
-        flt_2 = unpack("f", b_AvgTradePrice)
-        l_AvgTradePriceflt = float('.'.join(str(elem) for elem in flt_2))
-        l_AvgTradePrice = round(l_AvgTradePriceflt, 2)
-
-        l_Open_Interest = int.from_bytes(b_Open_Interest, byteorder= "little", signed=True)
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_LTPResponseData["Exchange"] = "NSE"
-            else :
-                l_LTPResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_LTPResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_LTPResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_LTPResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_LTPResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_LTPResponseData["Exchange"] = "BSEFO"
-
-              
-        # l_LTPResponseData["Exchange"] = l_exchange
-        l_LTPResponseData["Scrip Code"] = l_scrip
-        l_LTPResponseData["Time"] = l_time
-        # l_LTPResponseData["Type"] = "LTP"                 #l_msgtype
-
-        l_LTPResponseData["LTP_Rate"] = l_Rate
-        l_LTPResponseData["LTP_Qty"] = l_Qty
-        l_LTPResponseData["LTP_Cumulative Qty"] = l_Cumulative_Qty
-        l_LTPResponseData["LTP_AvgTradePrice"] = l_AvgTradePrice
-        l_LTPResponseData["LTP_Open Interest"] = l_Open_Interest
-
-        self._Broadcast_on_message(self.ws1,"LTP",l_LTPResponseData)
+    def DecodeMessage(self, f_msg):
+        # f_msg is a split frame: [exchange letter, scrip, time text, message type letter, 20-byte body]
+        return DecodeBroadcastBody(f_msg[0].encode(), f_msg[1], f_msg[2], f_msg[3].encode(), f_msg[4])
 
+    def LTP(self, f_msg):
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def MarketDepth(self, f_msg):
-        l_MarketDepthResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_BidRate,b_BidQty, b_BidOrder, b_OfferRate, b_OfferQty, b_OfferOrder  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:10], l_msg[4][10:14], l_msg[4][14:18], l_msg[4][18:]
-        
-        flt_1 = unpack("f", b_BidRate)
-        l_BidRateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_BidRate = round(l_BidRateflt, 2)
-
-        l_BidQty = int.from_bytes(b_BidQty, byteorder= "little", signed=True)
-        l_BidOrderflt = int.from_bytes(b_BidOrder, byteorder= "little", signed=True)
-        l_BidOrder = round(l_BidOrderflt, 2)
-
-        flt_2 = unpack("f", b_OfferRate)
-        l_OfferRateflt = float('.'.join(str(elem) for elem in flt_2))
-        l_OfferRate = round(l_OfferRateflt, 2)
-
-        l_OfferQty = int.from_bytes(b_OfferQty, byteorder= "little", signed=True)
-        l_OfferOrderflt = int.from_bytes(b_OfferOrder, byteorder= "little", signed=True)   
-        l_OfferOrder = round(l_OfferOrderflt, 2)     
-        
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_MarketDepthResponseData["Exchange"] = "NSE"
-            else :
-                l_MarketDepthResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_MarketDepthResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_MarketDepthResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_MarketDepthResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_MarketDepthResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_MarketDepthResponseData["Exchange"] = "BSEFO"
-
-
-        # l_MarketDepthResponseData["Exchange"] = l_exchange
-        l_MarketDepthResponseData["Scrip Code"] = l_scrip
-        l_MarketDepthResponseData["Time"] = l_time
-        # l_MarketDepthResponseData["Type"] = "MarketDepth"               #l_msgtype
-
-        l_MarketDepthResponseData["BidRate"] = l_BidRate
-        l_MarketDepthResponseData["BidQty"] = l_BidQty
-        l_MarketDepthResponseData["BidOrder"] = l_BidOrder
-        l_MarketDepthResponseData["OfferRate"] = l_OfferRate
-        l_MarketDepthResponseData["OfferQty"]= l_OfferQty
-        l_MarketDepthResponseData["OfferOrder"] = l_OfferOrder
-        if l_msgtype == "B":
-            l_MarketDepthResponseData["Level"] = 1
-        elif l_msgtype == "C":
-            l_MarketDepthResponseData["Level"] = 2
-        elif l_msgtype == "D":
-            l_MarketDepthResponseData["Level"] = 3
-        elif l_msgtype == "E":
-            l_MarketDepthResponseData["Level"] = 4
-        elif l_msgtype == "F":
-            l_MarketDepthResponseData["Level"] = 5
-        else:
-            pass
-
-        self._Broadcast_on_message(self.ws1,"MarketDepth",l_MarketDepthResponseData)
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def DayOHLC(self, f_msg):
-        l_DayOHLCResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_Open, b_High, b_Low, b_PrevDayClose, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:16], l_msg[4][16:]
-
-        flt_1 = unpack("f", b_Open)
-        l_Openflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Open = round(l_Openflt, 2)
-
-        flt_2 = unpack("f", b_High)
-        l_Highflt = float('.'.join(str(elem) for elem in flt_2))
-        l_High = round(l_Highflt, 2)
-
-        flt_3 = unpack("f", b_Low)
-        l_Lowflt = float('.'.join(str(elem) for elem in flt_3))
-        l_Low = round(l_Lowflt, 2)
-
-        flt_4 = unpack("f", b_PrevDayClose)
-        l_PrevDayCloseflt = float('.'.join(str(elem) for elem in flt_4))
-        l_PrevDayClose = round(l_PrevDayCloseflt, 2)
-
-        # l_Reserved = b_Reserved.decode()    
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_DayOHLCResponseData["Exchange"] = "NSE"
-            else :
-                l_DayOHLCResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_DayOHLCResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_DayOHLCResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_DayOHLCResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_DayOHLCResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_DayOHLCResponseData["Exchange"] = "BSEFO"
-
-        # l_DayOHLCResponseData["Exchange"] = l_exchange
-        l_DayOHLCResponseData["Scrip Code"] = l_scrip
-        l_DayOHLCResponseData["Time"] = l_time
-        # l_DayOHLCResponseData["Type"] = "DayOHLC"      #l_msgtype
-
-        l_DayOHLCResponseData["Open"] = l_Open
-        l_DayOHLCResponseData["High"] = l_High
-        l_DayOHLCResponseData["Low"] = l_Low
-        l_DayOHLCResponseData["PrevDayClose"] = l_PrevDayClose
-        # l_DayOHLCResponseData["Reserved"]= l_Reserved
-
-        self._Broadcast_on_message(self.ws1,"DayOHLC",l_DayOHLCResponseData)
-    
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def DPR(self, f_msg):
-        l_DPRResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_UpperCktLimit, b_LowerCktLimit, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:]
-
-        flt_1 = unpack("f", b_UpperCktLimit)
-        l_UpperCktLimitflt = float('.'.join(str(elem) for elem in flt_1))
-        l_UpperCktLimit = round(l_UpperCktLimitflt, 2)
-
-        flt_2 = unpack("f", b_LowerCktLimit)
-        l_LowerCktLimitflt = float('.'.join(str(elem) for elem in flt_2))
-        l_LowerCktLimit = round(l_LowerCktLimitflt, 2)
-
-        # l_Reserved = b_Reserved.decode()
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_DPRResponseData["Exchange"] = "NSE"
-            else :
-                l_DPRResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_DPRResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_DPRResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_DPRResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_DPRResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_DPRResponseData["Exchange"] = "BSEFO"
-
-        # l_DPRResponseData["Exchange"] = l_exchange
-        l_DPRResponseData["Scrip Code"] = l_scrip
-        l_DPRResponseData["Time"] = l_time
-        # l_DPRResponseData["Type"] = "DPR"      #l_msgtype
-
-        l_DPRResponseData["UpperCktLimit"] = l_UpperCktLimit
-        l_DPRResponseData["LowerCktLimit"] = l_LowerCktLimit
-        # l_DPRResponseData["Reserved"] = l_Reserved
-
-        self._Broadcast_on_message(self.ws1,"DPR",l_DPRResponseData)
-
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def Heartbeat(self, f_msg):
         # print("Heartbeat Request Packet Received")
@@ -1996,90 +2039,10 @@ class MOFSLOPENAPI(object):
         # print("Heartbeat Response Packet sent")
 
     def Index(self, f_msg):
-        # print("Index H Packet")
-        l_IndexResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_Rate, b_Reserved  = l_msg[4][:4], l_msg[4][4:]
-
-        flt_1 = unpack("f", b_Rate)
-        l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Rate = round(l_Rateflt, 2)
-
-        # l_Reserved = b_Reserved.decode()
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_IndexResponseData["Exchange"] = "NSE"
-            else :
-                l_IndexResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_IndexResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_IndexResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_IndexResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_IndexResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_IndexResponseData["Exchange"] = "BSEFO" 
-
-        # l_IndexResponseData["Exchange"] = l_exchange
-        l_IndexResponseData["Scrip Code"] = l_scrip
-        l_IndexResponseData["Time"] = l_time
-        # l_IndexResponseData["Type"] = "Index" #l_msgtype
-
-        l_IndexResponseData["Rate"] = l_Rate
-        # l_IndexResponseData["Reserved"] = l_Reserved
-
-        # print("Index H Packetafter")
-        self._Broadcast_on_message(self.ws1,"Index",l_IndexResponseData)
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def OpenInterest(self, f_msg):
-            l_OpenInterestResponseData = {}
-            l_msg = f_msg
-            l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-            b_OpenInterest, b_OpenInterestHigh, b_OpenInterestLow, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:]
-            # flt_1 = unpack("f", b_Rate)
-            # l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-            # l_Rate = round(l_Rateflt, 2)
-
-            l_OpenInterest = int.from_bytes(b_OpenInterest, byteorder= "little", signed=True)
-            l_OpenInterestHigh = int.from_bytes(b_OpenInterestHigh, byteorder= "little", signed=True)
-            l_OpenInterestLow = int.from_bytes(b_OpenInterestLow, byteorder= "little", signed=True)
-
-            # l_Reserved = b_Reserved.decode()
-
-            if l_exchange == "N":
-                if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                    l_OpenInterestResponseData["Exchange"] = "NSE"
-                else :
-                    l_OpenInterestResponseData["Exchange"] = "NSEFO"
-            elif l_exchange == "B":
-                l_OpenInterestResponseData["Exchange"] = "BSE"
-            elif l_exchange == "M":
-                l_OpenInterestResponseData["Exchange"] = "MCX"
-            elif l_exchange == "D":
-                l_OpenInterestResponseData["Exchange"] = "NCDEX"
-            elif l_exchange == "C":
-                l_OpenInterestResponseData["Exchange"] = "NSECD"
-            elif l_exchange == "G":
-                l_OpenInterestResponseData["Exchange"] = "BSEFO"
-
-
-            # l_OpenInterestResponseData["Exchange"] = l_exchange
-            l_OpenInterestResponseData["Scrip Code"] = l_scrip
-            l_OpenInterestResponseData["Time"] = l_time
-            # l_OpenInterestResponseData["Type"] = "OpenInterest"  #l_msgtype
-
-            l_OpenInterestResponseData["Open Interest"] = l_OpenInterest
-            l_OpenInterestResponseData["Open Interest High"] = l_OpenInterestHigh
-            l_OpenInterestResponseData["Open Interest Low"] = l_OpenInterestLow
-            # l_OpenInterestResponseData["Reserved"] = l_Reserved
-
-            self._Broadcast_on_message(self.ws1,"OpenInterest",l_OpenInterestResponseData)
+        self._Broadcast_on_message(self.ws1, *self.DecodeMessage(f_msg))
 
     def Broadcast_Logout(self):
         self.ws1.close()
@@ -2316,13 +2279,21 @@ class MOFSLOPENAPI(object):
                     self.TradeStatus_HeartBeat()
                     time.sleep(30)
 
+            # One heartbeat per connection: a reconnect must not leave the previous one running
+            self.TradeStatus_StopHeartBeat()
             background_task.cancelled = False
+            self.m_TradeStatusHeartbeat = background_task
             t = Thread(target=background_task)
             t.start()
         # if TradeStatusHeartbeat_flag:
         #     background_task.cancelled = False 
         
 
+    def TradeStatus_StopHeartBeat(self):
+        if self.m_TradeStatusHeartbeat is not None:
+            self.m_TradeStatusHeartbeat.cancelled = True
+            self.m_TradeStatusHeartbeat = None
+
     def __TradeStatus_on_message(self, ws2, message):
         j_TradeStatusResponse = message
         # print(type(j_TradeStatusResponse))
@@ -2335,7 +2306,9 @@ class MOFSLOPENAPI(object):
         print(error) 
         # self._TradeStatus_on_error(ws2, error)
                     
-        if ( "timed" in str(error) ) or ( "Connection is already closed" in str(error) ) or ( "Connection to remote host was lost" in str(error)):
+        if not self.TradeStatusAutoReconnect_flag:
+            pass
+        elif ( "timed" in str(error) ) or ( "Connection is already closed" in str(error) ) or ( "Connection to remote host was lost" in str(error)):
             self.TradeStatus_connect()
                        
 
@@ -2343,6 +2316,7 @@ class MOFSLOPENAPI(object):
         
         WriteIntoLog_TradeStatus("SUCCESS", "MOFSLOPENAPI.py", "TradeStatus Connection Closed")
         self.TradeStatusHeartbeat_flag = False
+        self.TradeStatus_StopHeartBeat()
         
         self._TradeStatus_on_close(ws2, close_status_code, close_msg)
 
@@ -2428,18 +2402,8 @@ class MOFSLOPENAPI(object):
 
         if (len(self.l_TCPscrip_code) < MaxBroadcastLimit):
 
-            if f_scriptcode not in self.l_TCPscrip_code:
-                self.l_TCPscrip_code.append(f_scriptcode)
-
-            l_exchange = f_exchange.upper()
-            if (l_exchange== "NSECD"):
-                l_exchangeindex = "C"
-            elif (l_exchange == "NCDEX"):
-                l_exchangeindex = "D"
-            elif (l_exchange == "BSEFO"):
-                l_exchangeindex = "G"
-            else :
-                l_exchangeindex = l_exchange[0]
+            l_exchangeindex = BroadcastExchangeLetter(f_exchange)
+            self.UpdateSubscription("l_TCPscrip_code", (l_exchangeindex.encode(), f_scriptcode), True)
 
             l_exchangetype = f_exchangetype.upper()
             l_exchangetypeindex = l_exchangetype[0]
@@ -2467,17 +2431,9 @@ class MOFSLOPENAPI(object):
             
     def TCPUnRegister(self, f_exchange, f_exchangetype, f_scriptcode):
         self.m_scriptask = "D"
-        self.l_TCPscrip_code.remove(f_scriptcode)
-
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-            l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
+        self.UpdateSubscription("l_TCPscrip_code", (l_exchangeindex.encode(), f_scriptcode), False)
 
         l_exchangetype = f_exchangetype.upper()
         l_exchangetypeindex = l_exchangetype[0]
@@ -2503,17 +2459,9 @@ class MOFSLOPENAPI(object):
         
         # l_exchange = f_exchange.upper()
         # l_exchangeindex = l_exchange[0]
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-            l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
 
-        self.l_TCPexchange_index.append(l_exchangeindex)
+        self.UpdateSubscription("l_TCPexchange_index", l_exchangeindex.encode(), True)
         
         if self.m_strMOFSLToken:
             self.TCPLogin_on_open()
@@ -2528,17 +2476,9 @@ class MOFSLOPENAPI(object):
 
         # l_exchange = f_exchange.upper()
         # l_exchangeindex = l_exchange[0]
-        l_exchange = f_exchange.upper()
-        if (l_exchange== "NSECD"):
-            l_exchangeindex = "C"
-        elif (l_exchange == "NCDEX"):
-            l_exchangeindex = "D"
-        elif (l_exchange == "BSEFO"):
-            l_exchangeindex = "G"
-        else :
-            l_exchangeindex = l_exchange[0]
+        l_exchangeindex = BroadcastExchangeLetter(f_exchange)
 
-        self.l_TCPexchange_index.remove(l_exchangeindex)
+        self.UpdateSubscription("l_TCPexchange_index", l_exchangeindex.encode(), False)
         # print("IndexUnregister Packet sent")
         if self.m_strMOFSLToken:
             Log_Message = ("TCPIndex %s UnRegister Packet Sent"%(f_exchange))
@@ -2562,347 +2502,40 @@ class MOFSLOPENAPI(object):
         else:
             pass
             # print(len(msg))
-            # try :
-            #     # q_msg = Queue()
-            #     for i in msg:
-            #         self.q_msg.put(i)
-            #         if self.q_msg.qsize() == 30:
-            #                 self.Packet_Parsing(self.q_msg)
-            #                 self.q_msg.get(q_msg[o:30]) 
-            # except Exception as e: 
-            #     print(e)
 
     def TCPPacket_Parsing(self, message):
-        # time.sleep(1)
         msg = message
-        # self._Broadcast_on_message(self.ws1,message_type,msg)
-        # print(msg)
-        # print(len(msg), type(msg))
 
         if len(msg) % self.m_TCPresponsepacketlength == 0:
-        
-            l_Response30bytes=[]
-            l_headerdecodedlist=[]
-            l_msglist=[]
-            for i in range(0, len(msg), self.m_TCPresponsepacketlength):
-                l_Response30bytes.append(msg[i:i+ self.m_TCPresponsepacketlength])
-                l_30bytessplitlist = l_Response30bytes
-            
-
-            for i in l_30bytessplitlist:
-                b_exchange, b_scrip, b_time, b_msgtype = i[:1], i[1:5], i[5:9], i[9:10]
-                b_20bytesbody = i[10:30]
-
-                exchange = b_exchange.decode()
-                scrip = int.from_bytes(b_scrip, byteorder= "little", signed=True)
-                epoch1 = int.from_bytes(b_time, byteorder= "little", signed=True)
-                epoch2 = datetime(1980, 1, 1, 0, 0, 0).timestamp()
-                t = epoch1 + epoch2
-                my_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(t))
-
-                msgtype = b_msgtype.decode()
-                
-                l_headerdecodedlist.append(exchange)
-                l_headerdecodedlist.append(scrip)
-                l_headerdecodedlist.append(my_time)
-                l_headerdecodedlist.append(msgtype)
-
-                l_headerdecodedlist.append(b_20bytesbody)
-            # print(l_headerdecodedlist)
-            # print(len(l_headerdecodedlist), type(l_headerdecodedlist))
-                    
-            l_msglist = [l_headerdecodedlist[i:i+5] for i in range(0, len(l_headerdecodedlist), 5)]
-            # print(l_msglist)
-            # print(len(l_msglist), type(l_msglist)) 
-
-
-
-            if self.m_TCPscriptask == "D":
-                for i in l_msglist:
-
-                    l_msg = i
-                    msg_type = i[3]
-                    l_scripcode = i[1]
-                    if (l_scripcode in self.l_TCPscrip_code):
-                        if msg_type == "A":
-                            self.TCPLTP(l_msg)
-                        elif (msg_type =="B" or msg_type =="C" or msg_type =="D"or msg_type =="E" or msg_type =="F"):
-                            self.TCPMarketDepth(l_msg)
-                        elif msg_type == "G":
-                            self.TCPDayOHLC(l_msg)
-                        elif msg_type == "W":
-                            self.TCPDPR(l_msg)
-                        elif msg_type == "m":
-                            self.TCPOpenInterest(l_msg)
-                        elif  msg_type == "1":
-                            # Log_Message = ("Heartbeat request %s received"%(l_msg))
-                            WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                            self.TCPHeartbeat(l_msg)
-                        else:
-                            # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                            pass
-            else:
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    
-                    if msg_type == "1":
-                        # Log_Message_1 = ("Heartbeat request %s received"%(l_msg))
-                        WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                        self.TCPHeartbeat(l_msg)
-                    else:
-                        # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                        pass      
-            
-            if self.m_TCPindextask == "H":
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    l_exchange = i[0]
-                    if (l_exchange in self.l_TCPexchange_index):
-                        if msg_type == "H":
-                            self.TCPIndex(l_msg)
-                        elif  msg_type == "1":
-                            # Log_Message_2 = ("Heartbeat request %s received"%(l_msg))
-                            WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                            self.TCPHeartbeat(l_msg)
-                        # elif msg_type == "G":
-                        #     self.DayOHLC(l_msg)
-                        else:
-                            # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                            pass
+            l_scripcodes = self.l_TCPscrip_code if self.m_TCPscriptask == "D" else None
+            l_exchangeindexes = self.l_TCPexchange_index if self.m_TCPindextask == "H" else None
+            if len(msg) >= m_BroadcastBatchMinFrames * self.m_TCPresponsepacketlength:
+                l_messages = DecodeBroadcastMessages(msg, l_scripcodes, l_exchangeindexes)
             else:
-                for i in l_msglist:
-                    l_msg = i
-                    msg_type = i[3]
-                    
-                    if msg_type == "1":
-                        WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
-                        self.TCPHeartbeat(l_msg)
-                    else:
-                        # self._Broadcast_on_message(self.ws1,msg_type,l_msg)
-                        pass                        
+                l_messages = DecodeBroadcastFrames(msg, l_scripcodes, l_exchangeindexes)
+
+            for l_message_type, l_data in l_messages:
+                if l_message_type == "Heartbeat":
+                    WriteIntoLog_Broadcast("SUCCESS", "MOFSLOPENAPI.py", "Heartbeat request received")
+                    self.TCPHeartbeat(l_data)
+                else:
+                    self._TCPBroadcast_on_message(l_message_type,l_data)
         else:
             l_message_type = "NotSpecified"
             self._TCPBroadcast_on_message(l_message_type,msg)
-            # print(msg)
-            # print(len(msg), type(msg))
-
-    def TCPLTP(self, f_msg):
-        l_LTPResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-        b_Rate, b_Qty, b_Cumulative_Qty, b_AvgTradePrice, b_Open_Interest = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:16], l_msg[4][16:]
-
-        flt_1 = unpack("f", b_Rate)
-        l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Rate = round(l_Rateflt, 2)
-
-        l_Qty = int.from_bytes(b_Qty, byteorder= "little", signed=True)
-        l_Cumulative_Qty = int.from_bytes(b_Cumulative_Qty, byteorder= "little", signed=True)
 
-        flt_2 = unpack("f", b_AvgTradePrice)
-        l_AvgTradePriceflt = float('.'.join(str(elem) for elem in flt_2))
-        l_AvgTradePrice = round(l_AvgTradePriceflt, 2)
-
-        l_Open_Interest = int.from_bytes(b_Open_Interest, byteorder= "little", signed=True)
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_LTPResponseData["Exchange"] = "NSE"
-            else :
-                l_LTPResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_LTPResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_LTPResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_LTPResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_LTPResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_LTPResponseData["Exchange"] = "BSEFO"
-
-              
-        # l_LTPResponseData["Exchange"] = l_exchange
-        l_LTPResponseData["Scrip Code"] = l_scrip
-        l_LTPResponseData["Time"] = l_time
-        # l_LTPResponseData["Type"] = "LTP"                 #l_msgtype
-
-        l_LTPResponseData["LTP_Rate"] = l_Rate
-        l_LTPResponseData["LTP_Qty"] = l_Qty
-        l_LTPResponseData["LTP_Cumulative Qty"] = l_Cumulative_Qty
-        l_LTPResponseData["LTP_AvgTradePrice"] = l_AvgTradePrice
-        l_LTPResponseData["LTP_Open Interest"] = l_Open_Interest
-
-        self._TCPBroadcast_on_message("LTP",l_LTPResponseData)
 
+    def TCPLTP(self, f_msg):
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPMarketDepth(self, f_msg):
-        l_MarketDepthResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_BidRate,b_BidQty, b_BidOrder, b_OfferRate, b_OfferQty, b_OfferOrder  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:10], l_msg[4][10:14], l_msg[4][14:18], l_msg[4][18:]
-        
-        flt_1 = unpack("f", b_BidRate)
-        l_BidRateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_BidRate = round(l_BidRateflt, 2)
-
-        l_BidQty = int.from_bytes(b_BidQty, byteorder= "little", signed=True)
-        l_BidOrderflt = int.from_bytes(b_BidOrder, byteorder= "little", signed=True)
-        l_BidOrder = round(l_BidOrderflt, 2)
-
-        flt_2 = unpack("f", b_OfferRate)
-        l_OfferRateflt = float('.'.join(str(elem) for elem in flt_2))
-        l_OfferRate = round(l_OfferRateflt, 2)
-
-        l_OfferQty = int.from_bytes(b_OfferQty, byteorder= "little", signed=True)
-        l_OfferOrderflt = int.from_bytes(b_OfferOrder, byteorder= "little", signed=True)   
-        l_OfferOrder = round(l_OfferOrderflt, 2)     
-        
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_MarketDepthResponseData["Exchange"] = "NSE"
-            else :
-                l_MarketDepthResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_MarketDepthResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_MarketDepthResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_MarketDepthResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_MarketDepthResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_MarketDepthResponseData["Exchange"] = "BSEFO"
-
-
-        # l_MarketDepthResponseData["Exchange"] = l_exchange
-        l_MarketDepthResponseData["Scrip Code"] = l_scrip
-        l_MarketDepthResponseData["Time"] = l_time
-        # l_MarketDepthResponseData["Type"] = "MarketDepth"               #l_msgtype
-
-        l_MarketDepthResponseData["BidRate"] = l_BidRate
-        l_MarketDepthResponseData["BidQty"] = l_BidQty
-        l_MarketDepthResponseData["BidOrder"] = l_BidOrder
-        l_MarketDepthResponseData["OfferRate"] = l_OfferRate
-        l_MarketDepthResponseData["OfferQty"]= l_OfferQty
-        l_MarketDepthResponseData["OfferOrder"] = l_OfferOrder
-        if l_msgtype == "B":
-            l_MarketDepthResponseData["Level"] = 1
-        elif l_msgtype == "C":
-            l_MarketDepthResponseData["Level"] = 2
-        elif l_msgtype == "D":
-            l_MarketDepthResponseData["Level"] = 3
-        elif l_msgtype == "E":
-            l_MarketDepthResponseData["Level"] = 4
-        elif l_msgtype == "F":
-            l_MarketDepthResponseData["Level"] = 5
-        else:
-            pass
-
-        self._TCPBroadcast_on_message("MarketDepth",l_MarketDepthResponseData)
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPDayOHLC(self, f_msg):
-        l_DayOHLCResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_Open, b_High, b_Low, b_PrevDayClose, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:16], l_msg[4][16:]
-
-        flt_1 = unpack("f", b_Open)
-        l_Openflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Open = round(l_Openflt, 2)
-
-        flt_2 = unpack("f", b_High)
-        l_Highflt = float('.'.join(str(elem) for elem in flt_2))
-        l_High = round(l_Highflt, 2)
-
-        flt_3 = unpack("f", b_Low)
-        l_Lowflt = float('.'.join(str(elem) for elem in flt_3))
-        l_Low = round(l_Lowflt, 2)
-
-        flt_4 = unpack("f", b_PrevDayClose)
-        l_PrevDayCloseflt = float('.'.join(str(elem) for elem in flt_4))
-        l_PrevDayClose = round(l_PrevDayCloseflt, 2)
-
-        # l_Reserved = b_Reserved.decode()    
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_DayOHLCResponseData["Exchange"] = "NSE"
-            else :
-                l_DayOHLCResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_DayOHLCResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_DayOHLCResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_DayOHLCResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_DayOHLCResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_DayOHLCResponseData["Exchange"] = "BSEFO"
-
-        # l_DayOHLCResponseData["Exchange"] = l_exchange
-        l_DayOHLCResponseData["Scrip Code"] = l_scrip
-        l_DayOHLCResponseData["Time"] = l_time
-        # l_DayOHLCResponseData["Type"] = "DayOHLC"      #l_msgtype
-
-        l_DayOHLCResponseData["Open"] = l_Open
-        l_DayOHLCResponseData["High"] = l_High
-        l_DayOHLCResponseData["Low"] = l_Low
-        l_DayOHLCResponseData["PrevDayClose"] = l_PrevDayClose
-        # l_DayOHLCResponseData["Reserved"]= l_Reserved
-
-        self._TCPBroadcast_on_message("DayOHLC",l_DayOHLCResponseData)
-    
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPDPR(self, f_msg):
-        l_DPRResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_UpperCktLimit, b_LowerCktLimit, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:]
-
-        flt_1 = unpack("f", b_UpperCktLimit)
-        l_UpperCktLimitflt = float('.'.join(str(elem) for elem in flt_1))
-        l_UpperCktLimit = round(l_UpperCktLimitflt, 2)
-
-        flt_2 = unpack("f", b_LowerCktLimit)
-        l_LowerCktLimitflt = float('.'.join(str(elem) for elem in flt_2))
-        l_LowerCktLimit = round(l_LowerCktLimitflt, 2)
-
-        # l_Reserved = b_Reserved.decode()
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_DPRResponseData["Exchange"] = "NSE"
-            else :
-                l_DPRResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_DPRResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_DPRResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_DPRResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_DPRResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_DPRResponseData["Exchange"] = "BSEFO"
-
-        # l_DPRResponseData["Exchange"] = l_exchange
-        l_DPRResponseData["Scrip Code"] = l_scrip
-        l_DPRResponseData["Time"] = l_time
-        # l_DPRResponseData["Type"] = "DPR"      #l_msgtype
-
-        l_DPRResponseData["UpperCktLimit"] = l_UpperCktLimit
-        l_DPRResponseData["LowerCktLimit"] = l_LowerCktLimit
-        # l_DPRResponseData["Reserved"] = l_Reserved
-
-        self._TCPBroadcast_on_message("DPR",l_DPRResponseData)
-
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPHeartbeat(self, f_msg):
         # print("Heartbeat Request Packet Received")
@@ -2915,96 +2548,10 @@ class MOFSLOPENAPI(object):
         # print("Heartbeat Response Packet sent")
 
     def TCPIndex(self, f_msg):
-        # print("Index H Packet")
-        l_IndexResponseData = {}
-        l_msg = f_msg
-        l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-        b_Rate, b_Reserved  = l_msg[4][:4], l_msg[4][4:]
-
-        flt_1 = unpack("f", b_Rate)
-        l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-        l_Rate = round(l_Rateflt, 2)
-
-        # l_Reserved = b_Reserved.decode()
-
-        if l_exchange == "N":
-            if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                l_IndexResponseData["Exchange"] = "NSE"
-            else :
-                l_IndexResponseData["Exchange"] = "NSEFO"
-        elif l_exchange == "B":
-            l_IndexResponseData["Exchange"] = "BSE"
-        elif l_exchange == "M":
-            l_IndexResponseData["Exchange"] = "MCX"
-        elif l_exchange == "D":
-            l_IndexResponseData["Exchange"] = "NCDEX"
-        elif l_exchange == "C":
-            l_IndexResponseData["Exchange"] = "NSECD"
-        elif l_exchange == "G":
-            l_IndexResponseData["Exchange"] = "BSEFO" 
-
-        # l_IndexResponseData["Exchange"] = l_exchange
-        l_IndexResponseData["Scrip Code"] = l_scrip
-        l_IndexResponseData["Time"] = l_time
-        # l_IndexResponseData["Type"] = "Index" #l_msgtype
-
-        l_IndexResponseData["Rate"] = l_Rate
-        # l_IndexResponseData["Reserved"] = l_Reserved
-
-        # print("Index H Packetafter")
-        self._TCPBroadcast_on_message("Index",l_IndexResponseData)
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPOpenInterest(self, f_msg):
-        try :
-
-            l_OpenInterestResponseData = {}
-            l_msg = f_msg
-            l_exchange, l_scrip, l_time, l_msgtype = l_msg[0], l_msg[1], l_msg[2], l_msg[3]
-
-            b_OpenInterest, b_OpenInterestHigh, b_OpenInterestLow, b_Reserved  = l_msg[4][:4], l_msg[4][4:8], l_msg[4][8:12], l_msg[4][12:]
-            # flt_1 = unpack("f", b_Rate)
-            # l_Rateflt = float('.'.join(str(elem) for elem in flt_1))
-            # l_Rate = round(l_Rateflt, 2)
-
-            l_OpenInterest = int.from_bytes(b_OpenInterest, byteorder= "little", signed=True)
-            l_OpenInterestHigh = int.from_bytes(b_OpenInterestHigh, byteorder= "little", signed=True)
-            l_OpenInterestLow = int.from_bytes(b_OpenInterestLow, byteorder= "little", signed=True)
-
-            # l_Reserved = b_Reserved.decode()
-
-            if l_exchange == "N":
-                if l_scrip <= 34999 or (l_scrip >= 888801 and l_scrip <= 888820):
-                    l_OpenInterestResponseData["Exchange"] = "NSE"
-                else :
-                    l_OpenInterestResponseData["Exchange"] = "NSEFO"
-            elif l_exchange == "B":
-                l_OpenInterestResponseData["Exchange"] = "BSE"
-            elif l_exchange == "M":
-                l_OpenInterestResponseData["Exchange"] = "MCX"
-            elif l_exchange == "D":
-                l_OpenInterestResponseData["Exchange"] = "NCDEX"
-            elif l_exchange == "C":
-                l_OpenInterestResponseData["Exchange"] = "NSECD"
-            elif l_exchange == "G":
-                l_OpenInterestResponseData["Exchange"] = "BSEFO"
-
-
-            # l_OpenInterestResponseData["Exchange"] = l_exchange
-            l_OpenInterestResponseData["Scrip Code"] = l_scrip
-            l_OpenInterestResponseData["Time"] = l_time
-            # l_OpenInterestResponseData["Type"] = "OpenInterest"  #l_msgtype
-
-            l_OpenInterestResponseData["Open Interest"] = l_OpenInterest
-            l_OpenInterestResponseData["Open Interest High"] = l_OpenInterestHigh
-            l_OpenInterestResponseData["Open Interest Low"] = l_OpenInterestLow
-            # l_OpenInterestResponseData["Reserved"] = l_Reserved
-
-            self._TCPBroadcast_on_message("OpenInterest",l_OpenInterestResponseData)
-        except Exception as e :
-            print(e)
-
-
+        self._TCPBroadcast_on_message(*self.DecodeMessage(f_msg))
 
     def TCPBroadcast_connect(self):
         # t1 = Thread(target=self.Websocket1_connect)        
@@ -3017,6 +2564,9 @@ class MOFSLOPENAPI(object):
             WriteIntoLog_Broadcast("FAILED", "MOFSLOPENAPI.py", str(e))
             self.m_MaxBroadcastLimit = 0
         
+        # A new connection starts on a frame boundary
+        self.m_TCPFrameBuffer = BroadcastFrameBuffer(f_framelength = self.m_TCPresponsepacketlength)
+
         if self.AttemptCountSocket <=5:
             # HOST = "127.0.0.1"  # The server's hostname or IP address
             HOST = "mofeed.motilaloswal.com"
@@ -3073,19 +2623,13 @@ class MOFSLOPENAPI(object):
         
         while True: 
 
-            data = self.s.recv(102400)
-            if not data :
+            # Reads land in the frame buffer; whole frames are parsed, a partial one waits for the next read
+            l_received = self.m_TCPFrameBuffer.RecvInto(self.s)
+            if not l_received :
                 pass
             else:
-                if len(data) >= 102400:
-                    pass
-                    # print(len(data))
-                    # WriteIntoLog_Broadcast("FAILED", "MOFSLOPENAPI.py", "len(data)" +str(len(data)))
-                elif len(data) < 30:
-                    pass
-                    # print(len(data))
-                    # WriteIntoLog_Broadcast("FAILED", "MOFSLOPENAPI.py", "len(data)" +str(len(data)))
-                else :
+                data = self.m_TCPFrameBuffer.Frames()
+                if data:
                     self.TCPBroadcastAutoRelogin_counter = 1
                     self.TCPPacket_Condition(data)
                     
@@ -3102,6 +2646,144 @@ class MOFSLOPENAPI(object):
 
 
 
+# --------------------------------------------------------------------------------------------------------
+# -------------------------------------------Asyncio REST client------------------------------------------
+# --------------------------------------------------------------------------------------------------------
+
+class AsyncMOFSLOPENAPI(MOFSLOPENAPI):
+    # asyncio twin of MOFSLOPENAPI. The REST methods keep the same names, arguments
+    # and response dicts but are coroutines that share one httpx.AsyncClient, so a
+    # single event loop can drive many client sessions without a thread per call.
+    # Websocket / TCP broadcast methods are inherited unchanged.
+
+    @classmethod
+    def FromSession(cls, f_Mofsl):
+        # Wrap an already logged-in MOFSLOPENAPI (token + device headers), without
+        # running the constructor again.
+        l_AsyncMofsl = cls.__new__(cls)
+        l_AsyncMofsl.__dict__.update(f_Mofsl.__dict__)
+        return l_AsyncMofsl
+
+    async def validate(self, f_URL, f_Data):
+
+        try:
+            m_headers = {k: v for k, v in self.GetHeaders().items() if v is not None}
+            response = await GetAsyncHttpClient().post(f_URL, headers = m_headers, content = json.dumps(f_Data))
+            j_ResponseMessage = response.content.decode('utf-8')
+            return j_ResponseMessage
+
+        except Exception as e:
+            WriteIntoLog("FAILED", "MOFSLOPENAPI.py", str(e))
+            return ("POST ERROR " + str(e))
+
+    async def __Post(self, f_ApiPath, f_Data, f_FailedFields):
+        # Shared request/response handling; on failure returns the same dict shape
+        # the blocking method builds (status, message, errorcode + f_FailedFields)
+        l_Response = {}
+
+        try:
+            l_strApiUrl = MOFSLOPENAPI.GetUrl(self, f_ApiPath)
+            l_strJSON = await self.validate(l_strApiUrl, f_Data)
+            if "POST ERROR " not in l_strJSON:
+                return json.loads(l_strJSON)
+            l_Message = l_strJSON.replace("POST ERROR ", "")
+
+        except Exception as e:
+            l_Message = str(e)
+
+        WriteIntoLog("FAILED", "MOFSLOPENAPI.py", f_ApiPath + " Request failed " + l_Message)
+
+        l_Response["status"] = "FAILED"
+        l_Response["message"] = l_Message
+        l_Response["errorcode"] = ""
+        l_Response.update(f_FailedFields)
+        return l_Response
+
+    async def resendotp(self):
+        return await self.__Post("resendotp", {"clientcode" : ""}, {"data": {"null"}})
+
+    async def verifyotp(self, f_otp):
+        return await self.__Post("verifyotp", {"otp": f_otp}, {"data": {"null"}})
+
+    async def login(self, f_clientID, f_password, f_twoFA, f_totp = None ,f_vendorinfo = None):
+
+        if f_clientID == "" or f_password == "":
+            WriteIntoLog("FAILED", "MOFSLOPENAPI.py", "login_Client_id or Password is empty")
+
+        self.m_vendorinfo = f_vendorinfo
+        self.m_clientcode = f_clientID
+
+        checksum = hashlib.sha256((f_password + self.m_strApikey).encode("utf-8")).hexdigest()
+        l_PostData = {
+            "userid": f_clientID,
+            "password": checksum,
+            "2FA": f_twoFA ,
+            "totp": f_totp
+        }
+
+        l_loginResponse = await self.__Post("Login", l_PostData, {"AuthToken": ""})
+        if l_loginResponse.get("status") == "SUCCESS":
+            self.m_strMOFSLToken = l_loginResponse["AuthToken"]
+            WriteIntoLog("SUCCESS", "MOFSLOPENAPI.py", "Login sucessfully")
+
+        return l_loginResponse
+
+    async def logout(self, f_strclientcode = None):
+        l_logoutResponse = await self.__Post("Logout", {"userid": f_strclientcode}, {})
+        if l_logoutResponse.get("status") == "SUCCESS":
+            self.m_strMOFSLToken = ""
+        return l_logoutResponse
+
+    async def GetProfile(self, f_strclientcode = None):
+        return await self.__Post("GetProfile", {"clientcode": f_strclientcode}, {"data": {"null"}})
+
+    async def GetOrderBook(self, f_OrderBookInfo):
+        return await self.__Post("OrderBook", f_OrderBookInfo, {"data": {"null"}})
+
+    async def GetTradeBook(self, f_strclientcode = None):
+        return await self.__Post("TradeBook", {"clientcode": f_strclientcode}, {"data": {"null"}})
+
+    async def GetPosition(self, f_strclientcode = None):
+        return await self.__Post("GetPosition", {"clientcode": f_strclientcode}, {"data": {"null"}})
+
+    async def GetDPHolding(self, f_strclientcode = None):
+        return await self.__Post("DPHolding", {"clientcode": f_strclientcode}, {"data": {"null"}})
+
+    async def PlaceOrder(self, f_PlaceOrderInfo):
+        return await self.__Post("PlaceOrder", f_PlaceOrderInfo, {"uniqueorderid": ""})
+
+    async def ModifyOrder(self, f_ModifyOrderInfo):
+        return await self.__Post("ModifyOrder", f_ModifyOrderInfo, {})
+
+    async def CancelOrder(self, f_orderid, f_clientcode = None):
+        return await self.__Post("CancelOrder", {"clientcode" : f_clientcode, "uniqueorderid" : f_orderid}, {})
+
+    async def PositionConversion(self, f_PositionConversionInfo):
+        return await self.__Post("positionconversion", f_PositionConversionInfo, {})
+
+    async def GetReportMargin(self, f_clientcode = None):
+        return await self.__Post("marginreport", {"clientcode" : f_clientcode}, {"data": {"null"}})
+
+    async def GetReportMarginSummary(self, f_clientcode = None):
+        return await self.__Post("marginsummary", {"clientcode" : f_clientcode}, {"data": {"null"}})
+
+    async def GetReportMarginDetail(self, f_clientcode = None):
+        return await self.__Post("margindetail", {"clientcode" : f_clientcode}, {"data": {"null"}})
+
+    async def GetLtp(self, f_LTPData):
+        return await self.__Post("ltadata", f_LTPData, {"data": {"null"}})
+
+    async def GetInstrumentFile(self, f_exchangename, f_clientcode = None):
+        return await self.__Post("exchangedata", {"clientcode" : f_clientcode, "exchangename" : f_exchangename}, {"data": {"null"}})
+
+    async def GetOrderDetailByUniqueorderID(self, f_orderid, f_clientcode = None):
+        return await self.__Post("getorderdetailbyunqueorderid", {"clientcode" : f_clientcode, "uniqueorderid" : f_orderid}, {"data": {"null"}})
 
+    async def GetTradeDetailByUniqueorderID(self, f_orderid, f_clientcode = None):
+        return await self.__Post("gettradedetailbyuniqueorderid", {"clientcode" : f_clientcode, "uniqueorderid" : f_orderid}, {"data": {"null"}})
 
+    async def GetBrokerageDetail(self, f_BrokerageDetailInfo):
+        return await self.__Post("getbrokeragedetail", f_BrokerageDetailInfo, {"data": {"null"}})
 
+    async def getbroadcastmaxlimit(self, f_clientcode = None):
+        return await self.__Post("getbroadcastmaxlimit", {"clientcode" : f_clientcode}, {"data": {"null"}})
@@ -0,0 +1,180 @@
+"""Broadcast feed decode throughput by buffer size.
+
+Feeds buffers of random 30-byte frames (LTP, depth, OHLC, DPR, index and
+open-interest messages for 200 subscribed scrips) through
+MOFSLOPENAPI.Packet_Parsing with a no-op callback, and reports packets/s for
+the per-frame Struct decoder, the NumPy batch decoder and the default
+threshold between them (MOFSL_BROADCAST_BATCH_MIN_FRAMES).
+
+    python bench/feed_decode.py [--baseline REV] [--sizes 1,64,128,1000,3400]
+    python bench/feed_decode.py --per-type [--baseline REV]
+
+--baseline loads MOFSLOPENAPI.py as of a git revision (e.g. 62307ff^ for
+the parser before the batch decoder) into a temp module, adds its
+throughput as a column and checks that it sends the same callbacks as this
+tree.
+
+--per-type reports microseconds per message for each message type instead:
+one-frame buffers through Packet_Parsing, and split frames through the
+handler methods (LTP, MarketDepth, ...) that callers use directly.
+"""
+import argparse
+import importlib.util
+import math
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+import MOFSLOPENAPI  # noqa: E402
+
+# message type letter → body layout, for filling plausible values
+BODIES = {"A": "<fiifi", "G": "<ffff4x", "W": "<ff12x", "H": "<f16x", "m": "<iii8x"}
+DEPTH = "<fihfih"   # B..F: market depth levels
+MESSAGE_TYPES = "AAAABCDEFGWmH"
+EXCHANGES = "NNNBM"
+SCRIPS = list(range(1000, 1200))
+# message type letter → handler method taking a split frame
+HANDLERS = {"A": "LTP", "B": "MarketDepth", "E": "MarketDepth", "G": "DayOHLC", "W": "DPR", "H": "Index",
+            "m": "OpenInterest"}
+
+
+def load_baseline(rev):
+    source = subprocess.run(["git", "-C", REPO, "show", f"{rev}:MOFSLOPENAPI.py"],
+                            check=True, capture_output=True).stdout
+    path = os.path.join(tempfile.mkdtemp(), "MOFSLOPENAPI_baseline.py")
+    with open(path, "wb") as f:
+        f.write(source)
+    spec = importlib.util.spec_from_file_location("MOFSLOPENAPI_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def feed_client(module, out=None):
+    """A MOFSLOPENAPI of `module` subscribed to SCRIPS on EXCHANGES, without connecting anything."""
+    client = object.__new__(module.MOFSLOPENAPI)
+    client.ws1 = None
+    client._Broadcast_on_message = (lambda ws, t, d: out.append((t, d))) if out is not None else (lambda ws, t, d: None)
+    client.m_scriptask, client.m_indextask = "D", "H"
+    if hasattr(module, "BroadcastKeys"):
+        # (exchange letter, scrip) pairs since subscriptions became per-exchange sets
+        client.l_scrip_code = frozenset((e.encode(), s) for e in EXCHANGES for s in SCRIPS)
+        client.l_exchange_index = frozenset(e.encode() for e in EXCHANGES)
+    else:
+        client.l_scrip_code = list(SCRIPS)
+        client.l_exchange_index = list(EXCHANGES)
+    return client
+
+
+def random_frame(rng, msgtype=None):
+    msgtype = msgtype or rng.choice(MESSAGE_TYPES)
+    layout = BODIES.get(msgtype, DEPTH)
+    values = [rng.uniform(1, 50000) if c == "f" else rng.randint(-30000, 30000) for c in layout if c in "fih"]
+    header = struct.pack("<ciic", rng.choice(EXCHANGES).encode(), rng.choice(SCRIPS),
+                         1400000000 + rng.randint(0, 5), msgtype.encode())
+    return header + struct.pack(layout, *values)
+
+
+def packets_per_second(client, buf, frames, budget=20000, runs=3):
+    """Best of `runs` timings of about `budget` frames each."""
+    repeats = max(1, budget // frames)
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            client.Packet_Parsing(buf)
+        best = min(best, time.perf_counter() - started)
+    return repeats * frames / best
+
+
+def with_threshold(frames, fn):
+    saved = MOFSLOPENAPI.m_BroadcastBatchMinFrames
+    MOFSLOPENAPI.m_BroadcastBatchMinFrames = frames
+    try:
+        return fn()
+    finally:
+        MOFSLOPENAPI.m_BroadcastBatchMinFrames = saved
+
+
+def comparable(messages):
+    # NaN rates never compare equal; compare them as text
+    return [(t, {k: "nan" if isinstance(v, float) and math.isnan(v) else v for k, v in d.items()})
+            for t, d in messages]
+
+
+def check_against(baseline, rng, buffers=300):
+    differing = 0
+    for _ in range(buffers):
+        buf = b"".join(random_frame(rng) for _ in range(rng.choice([1, 5, 50, 500])))
+        old, new = [], []
+        feed_client(baseline, old).Packet_Parsing(buf)
+        feed_client(MOFSLOPENAPI, new).Packet_Parsing(buf)
+        differing += comparable(old) != comparable(new)
+    return differing, buffers
+
+
+def split_frame(frame):
+    """The [exchange, scrip, time text, message type, body] list the handler methods take."""
+    return [frame[:1].decode(), struct.unpack_from("<i", frame, 1)[0], "2024-01-01 09:15:00",
+            frame[9:10].decode(), frame[10:30]]
+
+
+def us_per_message(fn, items, runs=5):
+    best = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items) * 1e6
+
+
+def per_type(baseline, rng, messages=2000):
+    modules = [("this tree", MOFSLOPENAPI)] + ([("baseline", baseline)] if baseline else [])
+    print("us per message, " + " / ".join(name for name, _ in modules))
+    for msgtype, handler in HANDLERS.items():
+        frames = [random_frame(rng, msgtype) for _ in range(messages)]
+        splits = [split_frame(f) for f in frames]
+        parsing = [us_per_message(feed_client(m).Packet_Parsing, frames) for _, m in modules]
+        handled = [us_per_message(getattr(feed_client(m), handler), splits) for _, m in modules]
+        print("  %s %-12s Packet_Parsing %s   handler %s" % (
+            msgtype, handler, " / ".join("%5.1f" % v for v in parsing), " / ".join("%5.1f" % v for v in handled)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--baseline", help="git revision to compare against")
+    parser.add_argument("--sizes", default="1,64,128,1000,3400")
+    parser.add_argument("--per-type", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    baseline = load_baseline(args.baseline) if args.baseline else None
+    if baseline is not None:
+        print("buffers with differing callbacks vs %s: %d of %d" % ((args.baseline,) + check_against(baseline, rng)))
+    if args.per_type:
+        per_type(baseline, rng)
+        return
+
+    client = feed_client(MOFSLOPENAPI)
+    header = "%8s %12s %12s %12s" % ("frames", "per-frame", "batch", "default")
+    print("packets/s\n" + header + (" %12s" % "baseline" if baseline else ""))
+    for frames in (int(n) for n in args.sizes.split(",")):
+        buf = b"".join(random_frame(rng) for _ in range(frames))
+        per_frame = with_threshold(10 ** 9, lambda: packets_per_second(client, buf, frames))
+        batch = with_threshold(1, lambda: packets_per_second(client, buf, frames))
+        default = packets_per_second(client, buf, frames)
+        line = "%8d %12.0f %12.0f %12.0f" % (frames, per_frame, batch, default)
+        if baseline is not None:
+            line += " %12.0f" % packets_per_second(feed_client(baseline), buf, frames)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Shared keep-alive requests.Session vs a new connection per call.
+
+Posts small JSON bodies to a local HTTP(S) server, once through the
+process-wide pooled session MOFSLOPENAPI.validate uses (GetHttpSession) and
+once through a bare requests.post per call, which is what validate did before.
+Reports calls/s and how many TCP connections the server accepted.
+
+    python bench/http_pool.py [--calls 2000] [--threads 1,8] [--tls]
+
+--tls serves HTTPS with a throwaway self-signed certificate (needs the
+openssl CLI), which is closer to the broker API: every new connection then
+pays a TLS handshake as well as the TCP one.
+"""
+import argparse
+import json
+import os
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from MOFSLOPENAPI import GetHttpSession  # noqa: E402
+
+RESPONSE = json.dumps({"status": "SUCCESS", "message": "", "errorcode": "", "data": []}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body go out in two writes; don't stall on delayed ACKs
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with Handler.lock:
+            Handler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, *args):
+        pass
+
+
+def self_signed_context(workdir):
+    cert, key = os.path.join(workdir, "cert.pem"), os.path.join(workdir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", key, "-out", cert,
+                    "-days", "1", "-subj", "/CN=localhost"], check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def start_server(tls):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if tls:
+        server.socket = self_signed_context(tempfile.mkdtemp()).wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/rest/book/v1/getorderbook"
+
+
+def run(post, url, calls, threads):
+    body = json.dumps({"clientcode": "AA000", "dateandtime": "01-Jan-2024 09:00:00"})
+    headers = {"Content-Type": "application/json"}
+
+    def one(_):
+        response = post(url, headers=headers, data=body, verify=False)
+        response.content
+
+    Handler.connections = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(calls)))
+    return calls / (time.perf_counter() - started), Handler.connections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", default="1,8")
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    server, url = start_server(args.tls)
+    session = GetHttpSession()
+    print(f"{'TLS' if args.tls else 'plain HTTP'}, {args.calls} POSTs per run")
+    for threads in (int(t) for t in args.threads.split(",")):
+        run(session.post, url, min(50, args.calls), threads)   # warm the pool
+        for name, post in (("new connection per call", requests.post), ("shared pooled session", session.post)):
+            rate, connections = run(post, url, args.calls, threads)
+            print(f"  threads={threads:<3} {name:<24} {rate:8.0f} calls/s   {connections:5d} connections")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Symbol master build/load time and /search_symbols latency.
+
+Builds a synthetic symbol master CSV (about 20% cash names, the rest F&O
+contracts, like security_id.csv), then times:
+
+- build_symbol_db: symbols.db with its indexes and FTS5 table, symbols.cols
+  and the in-memory search index;
+- load_symbol_snapshot: the startup path, until lot sizes are served and
+  until the background search index is attached;
+- per-query latency of LIKE (the original SQL), the FTS5 query, the trigram
+  SymbolSearchIndex, and the /search_symbols handler with its type-ahead cache.
+
+    python bench/symbol_search.py [--rows 150000] [--queries 60]
+
+Writes symbols.db, symbols.cols and the CSV into the working directory.
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import tempfile
+import time
+
+WORK_DIR = tempfile.mkdtemp(prefix="bench_")
+os.environ.setdefault("DATA_DIR", os.path.join(WORK_DIR, "data"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import init_dirs  # noqa: E402
+
+init_dirs.get_base_dir = lambda: WORK_DIR   # clients/, groups/ ... would otherwise land in the checkout
+import CT_FastAPI  # noqa: E402
+
+MONTHS = ["JAN", "FEB", "MAR", "APR"]
+
+
+def write_symbol_csv(path, rows, seed=1):
+    rng = random.Random(seed)
+    bases = ["".join(rng.choices(string.ascii_uppercase, k=rng.randint(3, 10))) for _ in range(3000)]
+    bases += ["NIFTY", "BANKNIFTY", "RELIANCE", "TCS", "INFY", "HDFCBANK"]
+    with open(path, "w") as f:
+        f.write("Exchange,Stock Symbol,Security ID,Min Qty\n")
+        for i in range(rows):
+            base = rng.choice(bases)
+            if rng.random() < 0.2:
+                f.write(f"{rng.choice(['NSE', 'BSE'])},{base},{10000 + i},1\n")
+            else:
+                symbol = f"{base} {rng.randint(1, 28)} {rng.choice(MONTHS)} {rng.randint(100, 30000)} {rng.choice(['CE', 'PE'])}"
+                f.write(f"NSEFO,{symbol},{10000 + i},{rng.choice([15, 25, 50, 75, 500])}\n")
+    return bases
+
+
+def make_queries(bases, count, seed=2):
+    rng = random.Random(seed)
+    queries = [(["nifty"], ""), (["banknifty", "ce"], "NSEFO"), (["rel"], ""), (["tcs", "25000"], ""),
+               (["n"], ""), (["zzzq"], ""), (["infy"], "NSE"), (["hd", "pe"], ""), (["x"], "BSE")]
+    while len(queries) < count:
+        queries.append(([rng.choice(bases).lower()[:rng.randint(2, 6)]], rng.choice(["", "NSE", "NSEFO"])))
+    return queries
+
+
+def type_ahead(queries):
+    """Every prefix of each query's first word, as a user typing it would send them."""
+    return [([w[:n]], exch) for (w, *_), exch in queries for n in range(1, len(w) + 1)]
+
+
+def like_search(conn, words, exchange):
+    where = " AND ".join(["LOWER([Stock Symbol]) LIKE ?"] * len(words))
+    params = [f"%{w}%" for w in words]
+    if exchange:
+        where += " AND UPPER(Exchange) = ?"
+        params.append(exchange)
+    return conn.execute(f"SELECT Exchange, [Stock Symbol], [Security ID] FROM {CT_FastAPI.TABLE_NAME} "
+                        f"WHERE {where} ORDER BY [Stock Symbol] LIMIT 20", params).fetchall()
+
+
+def fts_search(conn, words, exchange):
+    sql, params = CT_FastAPI.fts_search_sql(words, exchange)
+    return conn.execute(sql, params).fetchall()
+
+
+def per_query_ms(search, queries, repeat=3):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for words, exchange in queries:
+            search(words, exchange)
+    return (time.perf_counter() - started) * 1000 / (repeat * len(queries))
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=150000)
+    parser.add_argument("--queries", type=int, default=60)
+    args = parser.parse_args()
+
+    csv_path = "bench_symbols.csv"
+    bases = write_symbol_csv(csv_path, args.rows)
+    print(f"{args.rows} synthetic symbols")
+
+    _, seconds = timed(lambda: CT_FastAPI.build_symbol_db(csv_path))
+    print(f"  build_symbol_db (db, indexes, FTS5, columns, search index)  {seconds:7.2f} s")
+
+    started = time.perf_counter()
+    CT_FastAPI.load_symbol_snapshot()
+    print(f"  load_symbol_snapshot (lot sizes served)                     {(time.perf_counter() - started) * 1000:7.1f} ms")
+    while CT_FastAPI.symbol_snapshot.search_index is None:
+        time.sleep(0.01)
+    print(f"  ... search index attached in the background after           {time.perf_counter() - started:7.2f} s")
+
+    snap = CT_FastAPI.symbol_snapshot
+    conn = CT_FastAPI.get_symbol_db(snap)
+    queries = make_queries(bases, args.queries)
+    mismatches = sum(
+        [r[1] for r in like_search(conn, w, e)] != [r[1] for r in snap.search_index.search(w, e)]
+        for w, e in queries
+    )
+    print(f"  index vs LIKE: {mismatches} of {len(queries)} queries return different symbols")
+
+    print(f"per query, {len(queries)} queries")
+    print(f"  LIKE (original SQL)   {per_query_ms(lambda w, e: like_search(conn, w, e), queries):8.3f} ms")
+    if snap.fts_ready:
+        print(f"  FTS5 trigram table    {per_query_ms(lambda w, e: fts_search(conn, w, e), queries):8.3f} ms")
+    print(f"  SymbolSearchIndex     {per_query_ms(snap.search_index.search, queries):8.3f} ms")
+
+    typed = type_ahead(queries)
+    print(f"type-ahead, {len(typed)} prefix queries")
+    print(f"  SymbolSearchIndex     {per_query_ms(snap.search_index.search, typed, repeat=1):8.3f} ms")
+    CT_FastAPI.symbol_search_cache.entries.clear()
+    handler = lambda w, e: CT_FastAPI.search_symbols(q=" ".join(w), exchange=e)  # noqa: E731
+    print(f"  /search_symbols, cold {per_query_ms(handler, typed, repeat=1):8.3f} ms")
+    print(f"  /search_symbols, warm {per_query_ms(handler, typed, repeat=1):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
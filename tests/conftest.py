@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# CT_FastAPI creates its data folders, logs and symbol files relative to the working
+# directory when imported, and clients/, groups/ and copytrading_setups/ next to
+# init_dirs.py; keep them all out of the checkout.
+WORK_DIR = tempfile.mkdtemp(prefix="ct_fastapi_tests_")
+os.environ.setdefault("DATA_DIR", os.path.join(WORK_DIR, "data"))
+os.chdir(WORK_DIR)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import init_dirs  # noqa: E402
+
+init_dirs.get_base_dir = lambda: WORK_DIR
@@ -0,0 +1,69 @@
+"""/health must keep answering while slow broker work is in flight."""
+import asyncio
+import time
+
+import httpx
+
+import CT_FastAPI
+
+BROKER_DELAY = 1.0      # seconds every fake broker call takes
+HEALTH_BOUND = 0.2      # seconds /health may take while that work is pending
+CLIENTS = [f"C{i:03d}" for i in range(50)]
+
+
+class SlowBroker:
+    """Stands in for both the blocking and the asyncio broker session of one client."""
+
+    async def PlaceOrder(self, payload):
+        await asyncio.sleep(BROKER_DELAY)
+        return {"status": "SUCCESS", "uniqueorderid": f"X-{payload['clientcode']}"}
+
+    def GetPosition(self):
+        time.sleep(BROKER_DELAY)
+        return {"status": "SUCCESS", "data": []}
+
+
+def install_slow_broker(monkeypatch):
+    broker = SlowBroker()
+    sessions = CT_FastAPI.mofsl_sessions
+    monkeypatch.setattr(sessions, "get_by_userid", lambda userid: (userid, broker, userid))
+    monkeypatch.setattr(sessions, "get_async", lambda name: broker)
+    monkeypatch.setattr(sessions, "items", lambda: [(c, (broker, c)) for c in CLIENTS[:4]])
+
+
+async def health_latencies_during(method, url, **kwargs):
+    transport = httpx.ASGITransport(app=CT_FastAPI.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        slow = asyncio.create_task(client.request(method, url, **kwargs))
+        await asyncio.sleep(0.1)   # let the slow request reach the broker
+        latencies = []
+        for _ in range(5):
+            started = time.perf_counter()
+            response = await client.get("/health")
+            latencies.append(time.perf_counter() - started)
+            assert response.json() == {"ok": True}
+            assert not slow.done()
+        slow_response = await slow
+    return latencies, slow_response
+
+
+def test_health_during_place_order_fan_out(monkeypatch):
+    install_slow_broker(monkeypatch)
+    payload = {
+        "symbol": "NSE|RELIANCE|2885", "clients": CLIENTS, "quantityinlot": 1, "action": "BUY",
+        "ordertype": "MARKET", "producttype": "CNC", "orderduration": "DAY", "exchange": "NSE",
+    }
+
+    latencies, response = asyncio.run(health_latencies_during("POST", "/place_order", json=payload))
+
+    assert max(latencies) < HEALTH_BOUND, latencies
+    assert len(response.json()["order_responses"]) == len(CLIENTS)
+
+
+def test_health_during_blocking_broker_route(monkeypatch):
+    install_slow_broker(monkeypatch)
+
+    latencies, response = asyncio.run(health_latencies_during("GET", "/get_positions"))
+
+    assert max(latencies) < HEALTH_BOUND, latencies
+    assert response.status_code == 200
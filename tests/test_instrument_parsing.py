@@ -0,0 +1,87 @@
+"""Instrument file parsing for the broker-sourced symbol master.
+
+fixtures/instrument_file_nsefo.json is NOT a captured broker response: no real
+GetInstrumentFile output was available. It is hand-built in the shape of the
+Motilal Oswal scrip master (status/message/errorcode/data, lower-case field
+names such as scripcode, scripname, marketlot) and should be replaced with a
+real capture when one is taken.
+"""
+import json
+import os
+
+import pytest
+
+import CT_FastAPI
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+def test_sample_response_maps_onto_symbol_columns():
+    response = load_fixture("instrument_file_nsefo.json")
+    rows = CT_FastAPI.parse_instrument_rows("NSEFO", response["data"])
+
+    assert rows[0] == {"Exchange": "NSEFO", "Stock Symbol": "NIFTY 28-NOV-2024 FUT",
+                       "Security ID": 35001, "Min Qty": 25}
+    assert [r["Security ID"] for r in rows] == [35001, 43620, 51234]   # scripcode 0 placeholder dropped
+    assert [r["Min Qty"] for r in rows] == [25, 15, 500]
+
+
+def test_missing_column_fails_loudly():
+    data = [{"scripcode": 1, "scripname": "ABC"}]   # no lot size under any known key
+    with pytest.raises(CT_FastAPI.InstrumentLayoutError, match="Min Qty"):
+        CT_FastAPI.parse_instrument_rows("NSE", data)
+
+
+def test_empty_file_is_not_a_layout_error():
+    with pytest.raises(ValueError, match="no rows") as raised:
+        CT_FastAPI.parse_instrument_rows("NSECD", [])
+    assert not isinstance(raised.value, CT_FastAPI.InstrumentLayoutError)
+
+
+class FakeInstrumentSession:
+    def __init__(self, responses):
+        self.responses = responses
+
+    def GetInstrumentFile(self, exchange, userid):
+        return self.responses[exchange]
+
+
+def test_unusable_layout_falls_back_to_github(monkeypatch, tmp_path):
+    good = load_fixture("instrument_file_nsefo.json")
+    renamed = {"status": "SUCCESS", "data": [{"token": 1, "name": "ABC", "lot": 1}]}
+    session = FakeInstrumentSession({"NSEFO": good, "NSE": renamed})
+    monkeypatch.setattr(CT_FastAPI.mofsl_sessions, "items", lambda: [("master", (session, "U1"))])
+    monkeypatch.setattr(CT_FastAPI, "SYMBOL_EXCHANGE_DIR", str(tmp_path))
+    built = []
+    monkeypatch.setattr(CT_FastAPI, "build_symbol_db", built.append)
+    monkeypatch.setattr(CT_FastAPI, "recreate_sqlite_from_csv", lambda: "github csv")
+
+    source, result = CT_FastAPI.build_symbol_master_or_fallback(["NSEFO", "NSE"])
+
+    assert (source, result) == ("github", "github csv")
+    assert built == []   # no symbols table from the broker files
+
+
+def test_empty_exchange_keeps_its_last_good_file(monkeypatch, tmp_path):
+    good = load_fixture("instrument_file_nsefo.json")
+    session = FakeInstrumentSession({"NSEFO": good, "NCDEX": {"status": "SUCCESS", "data": []}})
+    monkeypatch.setattr(CT_FastAPI.mofsl_sessions, "items", lambda: [("master", (session, "U1"))])
+    monkeypatch.setattr(CT_FastAPI, "SYMBOL_EXCHANGE_DIR", str(tmp_path))
+    monkeypatch.setattr(CT_FastAPI, "SYMBOL_CSV", str(tmp_path / "security_id.csv"))
+    (tmp_path / "NCDEX.csv").write_text("Exchange,Stock Symbol,Security ID,Min Qty\nNCDEX,GUAR,7001,5\n")
+    built = []
+    monkeypatch.setattr(CT_FastAPI, "build_symbol_db", built.append)
+
+    source, status = CT_FastAPI.build_symbol_master_or_fallback(["NSEFO", "NCDEX"])
+
+    assert source == "broker"
+    assert status["NSEFO"] == 3 and status["NCDEX"].startswith("error: NCDEX: instrument file has no rows")
+    assert (tmp_path / "NCDEX.csv").read_text().endswith("NCDEX,GUAR,7001,5\n")
+    assert len(built) == 1
+    master = (tmp_path / "security_id.csv").read_text()
+    assert "GUAR" in master and "NIFTY 28-NOV-2024 FUT" in master
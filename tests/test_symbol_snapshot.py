@@ -0,0 +1,49 @@
+"""symbols.db and symbols.cols must describe the same symbol master generation."""
+import os
+import sqlite3
+
+import CT_FastAPI
+
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("Exchange,Stock Symbol,Security ID,Min Qty\n")
+        for exchange, symbol, security_id, min_qty in rows:
+            f.write(f"{exchange},{symbol},{security_id},{min_qty}\n")
+
+
+def test_columns_from_another_generation_are_rebuilt(monkeypatch, tmp_path):
+    monkeypatch.setattr(CT_FastAPI, "SQLITE_DB", str(tmp_path / "symbols.db"))
+    monkeypatch.setattr(CT_FastAPI, "SYMBOL_COLUMNS", str(tmp_path / "symbols.cols"))
+    monkeypatch.setattr(CT_FastAPI, "build_search_index_in_background", lambda snapshot: None)
+    old_csv, new_csv = tmp_path / "old.csv", tmp_path / "new.csv"
+    write_csv(old_csv, [("NSE", "ABC", 101, 1)])
+    write_csv(new_csv, [("NSEFO", "ABC 28 NOV FUT", 202, 50), ("NSE", "XYZ", 303, 1)])
+
+    CT_FastAPI.build_symbol_db(str(old_csv))
+    old_columns = (tmp_path / "symbols.cols").read_bytes()
+    CT_FastAPI.build_symbol_db(str(new_csv))
+    (tmp_path / "symbols.cols").write_bytes(old_columns)   # crash between the db and columns replaces
+
+    assert CT_FastAPI.load_symbol_snapshot()
+    columns = CT_FastAPI.symbol_snapshot.columns
+    assert columns.symbols() == ["ABC 28 NOV FUT", "XYZ"]
+    assert columns.get("202") == 50
+    conn = sqlite3.connect(CT_FastAPI.SQLITE_DB)
+    try:
+        assert CT_FastAPI.symbol_columns_stamp(CT_FastAPI.SYMBOL_COLUMNS) == conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_matching_columns_are_mapped_as_is(monkeypatch, tmp_path):
+    monkeypatch.setattr(CT_FastAPI, "SQLITE_DB", str(tmp_path / "symbols.db"))
+    monkeypatch.setattr(CT_FastAPI, "SYMBOL_COLUMNS", str(tmp_path / "symbols.cols"))
+    monkeypatch.setattr(CT_FastAPI, "build_search_index_in_background", lambda snapshot: None)
+    csv = tmp_path / "symbols.csv"
+    write_csv(csv, [("NSE", "ABC", 101, 1)])
+    CT_FastAPI.build_symbol_db(str(csv))
+    mtime = os.path.getmtime(tmp_path / "symbols.cols")
+
+    assert CT_FastAPI.load_symbol_snapshot()
+    assert os.path.getmtime(tmp_path / "symbols.cols") == mtime